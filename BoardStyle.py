@@ -1,78 +1,131 @@
+import collections
 import re
 
-from SwoopChecker import Checker, NestedError, output_format, checker_options
+from SwoopChecker import Checker, rule, rule_selected, NestedError, Ref, RefList, checker_options
 from LibraryStyle import LibraryLint
+from spatial import overlapping_pairs
+from boardscan import BoardScan
 import Swoop
 import math
 
 
+class BoardFacts(object):
+    # The flat view of a board the streamable rules use, read from its Swoop
+    # objects.  boardscan.BoardScan reads the same view straight from the
+    # file.
+
+    def __init__(self, brd, queries):
+        self.brd = brd
+        self.queries = queries
+
+    def get_filename(self):
+        return self.brd.get_filename()
+
+    def vias(self):
+        for s in self.queries.select("signals"):
+            for v in s.get_vias():
+                yield s.get_name(), v.get_x(), v.get_y(), v.get_drill()
+
+    def pours(self):
+        for p in self.queries.select("signals", "polygons"):
+            yield p.get_parent().get_name(), p.get_isolate()
+
+    def dimension(self):
+        plain = self.queries.select("plain_elements")
+        widths = plain.with_type(Swoop.Wire).with_layer("Dimension").get_width().unpack()
+        others = plain.without_type(Swoop.Hole).without_type(Swoop.Wire).without_type(Swoop.Circle).with_layer("Dimension")
+        return widths, len(others)
+
+    def displayed_attributes(self, attribute):
+        for t in self.queries.select("elements", "attributes").with_name(attribute).with_display(True):
+            yield t.get_parent().get_name(), t.get_size(), t.get_ratio(), t.get_font()
+
+
 class BoardLint(Checker):
 
+    checks = ["check_routing",
+              "check_libraries",
+              "check_outline",
+              "check_names",
+              "check_placement",
+              "check_overlaps",
+              "check_vias",
+              "check_pours",
+              "check_displayed_attributes"]
+
+    design = "brd"
+
     def do_check(self):
         if not self.brd:
             return
 
-        self.check_routing()
-        self.check_libraries()
-        self.check_outline()
-        self.check_names()
-        self.check_placement()
-        self.check_vias()
-        self.check_pours()
-        self.check_displayed_attributes()
+        if isinstance(self.brd, BoardScan):
+            # run_eaglelint_check only scans boards when the streamable
+            # rules are all that's enabled.
+            self.run_checks([c for c in self.checks if getattr(self, c).rule_streamable])
+        else:
+            self.run_checks(self.checks)
 
-        LibraryLint(lbrs=Swoop.From(self.brd).get_libraries(),
+        LibraryLint(lbrs=self.queries(self.brd).select("libraries"),
                     errors=self.errors,
+                    context=self.ctx,
                     fix=self.fix,
                     options=self.options).check()
 
+    @classmethod
+    def needs_board_tree(cls, options):
+        # The board's own libraries get checked with LibraryLint's rules.
+        return (super(BoardLint, cls).needs_board_tree(options) or
+                any(rule_selected(r.rule_id, options) for r in LibraryLint.get_rules()))
+
+    def board_facts(self):
+        # What the streamable rules read the board through.
+        if isinstance(self.brd, BoardScan):
+            return self.brd
+        return BoardFacts(self.brd, self.queries(self.brd))
+
+    @rule("brd-pours", "Polygon pours with non-zero isolate", streamable=True, covers=["signals"])
     def check_pours(self):
         with self.errors.nest(self.brd.get_filename()):
 
-            for p in Swoop.From(self.brd).get_signals().get_polygons():
-                if p.get_isolate() not in [0, 0.0, None]:
-                    self.warn("A pour in {} has non-zero 'isolate'.  This is unusual, and probably not what you want.".format(p.get_parent().get_name()))
+            for signal, isolate in self.board_facts().pours():
+                if isolate not in [0, 0.0, None]:
+                    self.warn("A pour in {} has non-zero 'isolate'.  This is unusual, and probably not what you want.".format(signal))
 
+    @rule("brd-attributes", "Geometry of displayed NAME and VALUE attributes", streamable=True, covers=["elements"])
     def check_displayed_attributes(self):
         with self.errors.nest(self.brd.get_filename()):
-            names = Swoop.From(self.brd).get_elements().get_attributes().with_name("NAME").with_display(True)
-            for t in names:
+            names = list(self.board_facts().displayed_attributes("NAME"))
+            for element, size, ratio, font in names:
                 #fixme The default value for ratio is not working right for attributes.  so check for != None
-                if t.get_size() < checker_options.silkscreen_min_size or not (t.get_ratio() == checker_options.silkscreen_ratio or t.get_ratio() == None) or t.get_font() not in checker_options.silkscreen_fonts:
-                    if False:#self.fix:1
-                        t.set_size(checker_options.silkscreen_min_size).set_ratio(checker_options.silkscreen_ratio).set_font(
-                            checker_options.silkscreen_fonts[0])
-                    else:
-                        self.warn(
-                            u"'{}' in reference designator has wrong geometry (size={}mm, ratio={}%, font={}).  Should be {}mm, {}%, and one of these fonts that will render properly on the board during manufacturing: {}.".format(
-                                t.get_parent().get_name(),
-                                t.get_size(), t.get_ratio(), t.get_font(),
-                                checker_options.silkscreen_min_size,
-                                checker_options.silkscreen_ratio,
-                                ", ".join(checker_options.silkscreen_fonts)), inexcusable=True)
+                if size < checker_options.silkscreen_min_size or not (ratio == checker_options.silkscreen_ratio or ratio == None) or font not in checker_options.silkscreen_fonts:
+                    self.warn(
+                        u"'{}' in reference designator has wrong geometry (size={}mm, ratio={}%, font={}).  Should be {}mm, {}%, and one of these fonts that will render properly on the board during manufacturing: {}.".format(
+                            element,
+                            size, ratio, font,
+                            checker_options.silkscreen_min_size,
+                            checker_options.silkscreen_ratio,
+                            ", ".join(checker_options.silkscreen_fonts)), inexcusable=True)
 
-            sizes = names.get_size().unique()
+            # In the order they're first found, so the message is the same every run.
+            sizes = collections.OrderedDict.fromkeys(size for element, size, ratio, font in names).keys()
 
             if len(sizes) > 1:
                 self.warn("Your reference designators are not all the same size.  I found these sizes: {}".format(", ".join(map(str,sizes))))
 
-            values = Swoop.From(self.brd).get_elements().get_attributes().with_name("VALUE").with_display(True)
+            values = list(self.board_facts().displayed_attributes("VALUE"))
 
-            for t in values:
-                if t.get_size() < checker_options.silkscreen_min_size or (t.get_ratio() != checker_options.silkscreen_ratio and t.get_ratio() != None)   or t.get_font() not in checker_options.silkscreen_fonts:
-                    if False:#self.fix:
-                        t.set_size(checker_options.silkscreen_min_size).set_ratio(checker_options.silkscreen_ratio).set_font(
-                            checker_options.silkscreen_fonts[0])
-                    else:
-                        self.warn(
-                            u"'{}' in value on board has wrong geometry (size={}mm, ratio={}%, font={}).  Should be {}mm, {}%, and one of these fonts that will render properly on the board during manufacturing: {}.".format(
-                                t.get_parent().get_name(),
-                                t.get_size(), t.get_ratio(), t.get_font(),
-                                checker_options.silkscreen_min_size,
-                                checker_options.silkscreen_ratio,
-                                ", ".join(checker_options.silkscreen_fonts)), inexcusable=True)
+            for element, size, ratio, font in values:
+                if size < checker_options.silkscreen_min_size or (ratio != checker_options.silkscreen_ratio and ratio != None)   or font not in checker_options.silkscreen_fonts:
+                    self.warn(
+                        u"'{}' in value on board has wrong geometry (size={}mm, ratio={}%, font={}).  Should be {}mm, {}%, and one of these fonts that will render properly on the board during manufacturing: {}.".format(
+                            element,
+                            size, ratio, font,
+                            checker_options.silkscreen_min_size,
+                            checker_options.silkscreen_ratio,
+                            ", ".join(checker_options.silkscreen_fonts)), inexcusable=True)
 
-            sizes = values.get_size().unique()
+            sizes = collections.OrderedDict.fromkeys(size for element, size, ratio, font in values).keys()
 
             if len(sizes) > 1:
                 self.warn("Your size labels are not all the same size.  I found these sizes: {}".format(", ".join(map(str,sizes))))
@@ -84,19 +137,20 @@ class BoardLint(Checker):
         y = int(round(part.get_y() * scale))
         return (x % grid) != 0 or (y % grid) != 0
 
+    @rule("brd-vias", "Oversized via drills", streamable=True, covers=["signals"])
     def check_vias(self):
         with self.errors.nest(self.brd.get_filename()):
-            for s in Swoop.From(self.brd.get_signals()):
-                for v in s.get_vias():
-                    if v.get_drill() > 0.8:
-                        self.warn("The via at ({},{}) on {} is too big ({}mm). You probably don't want vias larger than 0.8mm".format(v.get_x(), v.get_y(), output_format(s), v.get_drill()))
+            for signal, x, y, drill in self.board_facts().vias():
+                if drill > 0.8:
+                    self.warn("The via at ({},{}) on {} is too big ({}mm). You probably don't want vias larger than 0.8mm", x, y, Ref(signal, "net"), drill, cause=signal)
 
+    @rule("brd-placement", "Parts and labels aligned to the placement grid", covers=["elements"])
     def check_placement(self):
         with self.errors.nest(self.brd.get_filename()):
-            for e in Swoop.From(self.brd).get_elements():
+            for e in self.queries(self.brd).select("elements"):
                 grid = 0.5
                 if self.check_alignment(e, grid):
-                    self.warn("Part {} at ({}, {}) is not not aligned to {}mm grid.".format(e.get_name(), e.get_x(), e.get_y(), grid))
+                    self.warn("Part {} at ({}, {}) is not not aligned to {}mm grid.", e.get_name(), e.get_x(), e.get_y(), grid)
 
                 for a in Swoop.From(e).get_attributes().with_display(True):
                     if a.get_name() == "VALUE" and a.get_value() in ["", None]:  # If value is "" then it doesn't show up and there is really no way to fix it in eagle.
@@ -104,66 +158,71 @@ class BoardLint(Checker):
                     grid = 0.1
                     if self.check_alignment(a, grid):
                         if self.fix:
-                            a.set_x(round(a.get_x()/grid) * grid)
-                            a.set_y(round(a.get_y()/grid) * grid)
+                            self.fixes.set(a, x=round(a.get_x()/grid) * grid, y=round(a.get_y()/grid) * grid)
                         else:
-                            self.warn("Label '{}' of {} at ({}, {}) in layer {} is not aligned to {}mm grid. ".format(a.get_name(), e.get_name(), a.get_x(), a.get_y(), a.get_layer(), grid ))
+                            self.warn("Label '{}' of {} at ({}, {}) in layer {} is not aligned to {}mm grid. ", a.get_name(), e.get_name(), a.get_x(), a.get_y(), a.get_layer(), grid)
 
 
+    @rule("brd-overlaps", "Overlapping part keepout areas", uses=["spatial"], covers=["elements", "packages"])
+    def check_overlaps(self):
+        with self.errors.nest(self.brd.get_filename()):
+            sides = self.ctx.spatial(self.brd)
+            for side in ["top", "bottom"]:
+                for a, b in overlapping_pairs(sides[side]):
+                    self.warn("Parts {} and {} overlap on the {} of the board.  Move them apart so their keepout areas don't intersect.", a, b, side)
+
+    @rule("brd-names", "Reference designator format", covers=["elements", "parts"])
     def check_names(self):
         with self.errors.nest(self.brd.get_filename()):
-            for p in Swoop.From(self.brd).get_elements().get_name():
+            for p in self.queries(self.brd).select("elements").get_name():
                 m = re.match("[A-Z][A-Z]?\d+", p)
                 if not m and self.sch.get_part(p):
                     self.warn(
                         "The name of part '{}' is too long.  It should be at most two capital letters followed numbers.".format(
                             p))
 
+    @rule("brd-outline", "Contents of the Dimension layer", streamable=True, covers=["plain"])
     def check_outline(self):
         with self.errors.nest(self.brd.get_filename()):
-            dims = Swoop.From(self.brd).get_plain_elements().with_type(Swoop.Wire).with_layer("Dimension")
-            self.info("Found {} lines in layer 'Dimension'".format(len(dims)))
-            if dims.filtered_by(lambda x:x.get_width() < 0.01).count():
+            widths, non_wire = self.board_facts().dimension()
+            self.info("Found {} lines in layer 'Dimension'".format(len(widths)))
+            if any(w < 0.01 for w in widths):
                 self.warn("Lines in 'Dimension' should have width >= 0.01mm.  Otherwise some CAM viewers have trouble displaying them the board outline.", inexcusable=True)
 
-            non_wire = Swoop.From(self.brd).get_plain_elements().without_type(Swoop.Hole).without_type(Swoop.Wire).without_type(Swoop.Circle).with_layer("Dimension")
-            if len(non_wire):
+            if non_wire:
                 self.warn("You things in your Dimension layer other than lines, arcs, and circles.  You probably don't want that.", inexcusable=True)
 
+    @rule("brd-libraries", "Board packages are in the libraries")
     def check_libraries(self):
         with self.errors.nest(self.brd.get_filename()):
-            lbr_list = self.lbrs
-
-            libs = {l.get_library().get_name().upper(): l for l in lbr_list}
+            catalog = self.catalog
 
             for part in self.brd.get_elements():
                 library = part.get_library().upper()
-                lib = libs.get(library)
+                lib = catalog.library(library)
                 if lib is None:
                     self.errors.record_warning(part, "Can't find library '{}' for part '{}'".format(library, part.get_name()))
                 else:
                     with self.errors.nest(part):
-                        package = lib.get_library().get_package(part.get_package())
-                        if not package:
-                            self.warn(u"Can't find package {} in library {}".format(part.get_package(), lib.get_library().get_name()))
-                        elif not part.find_package().is_equal(package):
-                            pass
-                            # DISABLED DUe to FUsion360
+                        if not catalog.has_package(library, part.get_package()):
+                            self.warn(u"Can't find package {} in library {}".format(part.get_package(), lib.name))
+                        # DISABLED DUe to FUsion360
+                        #elif fingerprint(part.find_package()) != catalog.fingerprint("packages", library, part.get_package()):
                             #self.warn(
                              #   u"Package {} doesn't match package in library '{}'.  You need to update the libraries in your board: 'Library->Update...' or 'Library->Update All'".format(
-                             #       package.get_name(),
+                             #       part.get_package(),
                              #       library), inexcusable=True)
 
 
+    @rule("brd-routing", "Unrouted nets, crossing and odd-angle traces", uses=["wires"], covers=["signals"])
     def check_routing(self):
         with NestedError(self.errors, self.brd.get_filename()):
 
-            unrouted = Swoop.From(self.brd).get_signals().get_wires().with_width(0.0)
+            unrouted = self.ctx.wires(self.brd).unrouted()
             if unrouted.count() > 0:
-                self.error(u"You have unrouted nets: {}".format(
-                    " ".join(map(output_format, unrouted.get_parent().unique().sort()))), inexcusable=True)
+                self.error(u"You have unrouted nets: {}", RefList(unrouted.get_parent().unique().sort()), inexcusable=True)
 
-            routed_wires = Swoop.From(self.brd).get_signals().get_wires().without_width(0.0)
+            routed_wires = self.ctx.wires(self.brd).routed()
 
             self.check_intersections(routed_wires)
 
@@ -175,7 +234,5 @@ class BoardLint(Checker):
                         pass
                     else:
                         self.warn(
-                            "Net routed at odd angle: {} centered at ({}, {}) in layer {}.  Net should only be vertical, horizontal, or diagonal (i.e., 45 degrees).".format(output_format(w.get_parent()),
-                                                                                                  (x1 + x2) / 2,
-                                                                                                  (y1 + y2) / 2,
-                                                                                                  w.get_layer()))
\ No newline at end of file
+                            "Net routed at odd angle: {} centered at ({}, {}) in layer {}.  Net should only be vertical, horizontal, or diagonal (i.e., 45 degrees).",
+                            w.get_parent(), (x1 + x2) / 2, (y1 + y2) / 2, w.get_layer(), cause=w.get_parent())
\ No newline at end of file
@@ -0,0 +1,111 @@
+from SwoopChecker import Checker, rule, Ref
+import Swoop
+
+
+def padless(package):
+    # Mounting holes, fiducials, logos and other artwork.
+    return package is not None and not package.get_pads() and not package.get_smds()
+
+
+class ConsistencyLint(Checker):
+    # Checks that a board is still a faithful copy of its schematic.  Both
+    # documents are reduced to keyed maps in one pass each and compared with
+    # set operations, so this is linear in the size of the design.
+
+    checks = ["check_parts",
+              "check_net_membership"]
+
+    def do_check(self):
+        if not self.sch or not self.brd:
+            return
+
+        with self.errors.nest(self.brd.get_filename()):
+            self.run_checks(self.checks)
+
+    def schematic_parts(self):
+        # part name -> (library, package) for every part that has a footprint
+        # with pads.
+        parts = {}
+        for p in self.queries(self.sch).select("parts"):
+            device = p.find_device()
+            if device is None or not device.get_package() or padless(device.find_package()):
+                continue
+            parts[p.get_name()] = (p.get_library().upper(), device.get_package())
+        return parts
+
+    def board_parts(self):
+        # Eagle lets you add parts without pads (logos, artwork) to just the
+        # board, so those don't count, on either side.
+        parts = {}
+        for e in self.queries(self.brd).select("elements"):
+            if padless(e.find_package()):
+                continue
+            parts[e.get_name()] = (e.get_library().upper(), e.get_package())
+        return parts
+
+    def schematic_net_members(self):
+        # net name -> set of (part, pad), resolving pins to pads through each
+        # device's connects.
+        pads_for_device = {}
+        pads_for_part = {}
+        for p in self.queries(self.sch).select("parts"):
+            device = p.find_device()
+            if device is None or not device.get_package():
+                continue
+            key = (p.get_library(), p.get_deviceset(), p.get_device())
+            if key not in pads_for_device:
+                pads_for_device[key] = {(c.get_gate(), c.get_pin()): c.get_pads() for c in device.get_connects()}
+            pads_for_part[p.get_name()] = pads_for_device[key]
+
+        members = {}
+        for n in self.queries(self.sch).select("sheets", "nets"):
+            pads = members.setdefault(n.get_name(), set())
+            for r in Swoop.From(n).get_segments().get_pinrefs():
+                connects = pads_for_part.get(r.get_part())
+                if connects is None:
+                    continue
+                for pad in connects.get((r.get_gate(), r.get_pin()), []):
+                    pads.add((r.get_part(), pad))
+        return members
+
+    def board_net_members(self):
+        members = {}
+        for s in self.queries(self.brd).select("signals"):
+            pads = members.setdefault(s.get_name(), set())
+            for c in s.get_contactrefs():
+                pads.add((c.get_element(), c.get_pad()))
+        return members
+
+    @rule("xref-parts", "Parts and packages match between schematic and board", covers=["parts", "elements", "devicesets"])
+    def check_parts(self):
+        sch_parts = self.schematic_parts()
+        brd_parts = self.board_parts()
+
+        for name in sorted(set(sch_parts) - set(brd_parts)):
+            self.error(u"Part {} is in the schematic but not on the board.  Forward/back annotation is broken.", Ref(name, "part"), inexcusable=True)
+
+        for name in sorted(set(brd_parts) - set(sch_parts)):
+            self.warn(u"Part {} is on the board but not in the schematic.", Ref(name, "part"))
+
+        for name in sorted(set(sch_parts) & set(brd_parts)):
+            if sch_parts[name] != brd_parts[name]:
+                self.error(u"Part {} uses package {} from library {} in the schematic but package {} from library {} on the board.",
+                           Ref(name, "part"),
+                           sch_parts[name][1], sch_parts[name][0],
+                           brd_parts[name][1], brd_parts[name][0], inexcusable=True)
+
+    @rule("xref-nets", "Net membership matches between schematic and board", covers=["parts", "nets", "elements", "signals", "devicesets"])
+    def check_net_membership(self):
+        sch_nets = self.schematic_net_members()
+        brd_nets = self.board_net_members()
+
+        format_pads = lambda pads: ", ".join(u"{}.{}".format(part, pad) for part, pad in sorted(pads))
+
+        for name in sorted(set(sch_nets) | set(brd_nets)):
+            sch_pads = sch_nets.get(name, set())
+            brd_pads = brd_nets.get(name, set())
+
+            if sch_pads - brd_pads:
+                self.error(u"Net {} connects {} in the schematic but not on the board.", Ref(name, "net"), format_pads(sch_pads - brd_pads), inexcusable=True)
+            if brd_pads - sch_pads:
+                self.error(u"Net {} connects {} on the board but not in the schematic.", Ref(name, "net"), format_pads(brd_pads - sch_pads), inexcusable=True)
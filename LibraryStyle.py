@@ -1,14 +1,23 @@
-from SwoopChecker import Checker, NestedError, checker_options, bounding_box_size, inch_to_mm, mm_to_inch
+import collections
+import itertools
+
+from SwoopChecker import Checker, rule, NestedError, checker_options, bounding_box_size, inch_to_mm, mm_to_inch
+from parallel import fork_map
 
 import Swoop
 
 class LibraryLint(Checker):
 
+    checks = ["check_symbol",
+              "check_package",
+              "check_deviceset"]
+
     def __init__(self, *args, **kwargs):
         super(LibraryLint, self).__init__(*args, **kwargs)
         self.required_deviceset_attributes = ["CREATOR", "DIST", "DISTPN"]  # , "MFR", "MPN",
 
     def do_check(self):
+        libraries = []
         for library in self.lbrs:
             if isinstance(library, Swoop.LibraryFile):
                 name = library.get_filename()
@@ -17,41 +26,96 @@ class LibraryLint(Checker):
                 name = library.get_name()
 
             if name in (self.options.get("skipped_lbrs") or []):
+                break
+            libraries.append((name, library))
+
+        # A rule's budget covers all of a library's items, so rules with
+        # budgets aren't split between workers.
+        jobs = self.options.get("jobs") or 1
+        if jobs > 1 and not self.fix and not self.errors.aggregate and self.rule_budget() is None:
+            self.check_in_parallel(libraries, jobs)
+            return
+
+        for name, library in libraries:
+            if self.errors.cancelled:
                 return
-
             with NestedError(self.errors, name):
-                self.info("Examined {}".format(name))
-                fix = self.fix
-
-                if fix:
-                    for t in Swoop.From(library).get_devicesets().get_devices().get_technologies():
-                        for attr in self.required_deviceset_attributes:
-                            if not t.get_attribute(attr) or not t.get_attribute(attr).get_value():
-                                t.add_attribute(Swoop.Attribute().set_name(attr).set_value("Unknown"))
-
-                    for p in library.get_packages():
-                        if not Swoop.From(p).get_drawing_elements().without_type(Swoop.Hole).with_layer("tKeepout").count():
-                            p.add_drawing_element(Swoop.Wire().set_x1(0).set_y1(0).set_x2(0).set_y2(0).set_width(1).set_layer("tKeepout"))
-
-                for s in Swoop.From(library).get_symbols():
-                    self.check_symbol(s, checker_options.power_and_ground_names)
-
-                for p in Swoop.From(library).get_packages():
-                    self.check_package(p)
-
-                for ds in Swoop.From(library).get_devicesets():
-                    self.check_deviceset(ds, checker_options.power_and_ground_names)
-
+                self.examined(name)
+                self.run_library_items(self.library_items(library))
+
+    def examined(self, name):
+        # Serial and parallel runs report this from the same place, so their
+        # findings match.
+        self.info("Examined {}".format(name))
+
+    def run_library_items(self, items):
+        # Each rule runs over its items under one budget.
+        for check, run in itertools.groupby(items, key=lambda i: i[0]):
+            if self.errors.cancelled:
+                return
+            self.run_rule_items(check, [args for c, args in run])
+
+    def library_items(self, library):
+        # [(check, args), ...] for the enabled checks on each of the
+        # library's items, in the order we check them.
+        items = []
+        if self.check_enabled("check_symbol"):
+            items += [("check_symbol", (s, checker_options.power_and_ground_names)) for s in Swoop.From(library).get_symbols()]
+        if self.check_enabled("check_package"):
+            items += [("check_package", (p,)) for p in Swoop.From(library).get_packages()]
+        if self.check_enabled("check_deviceset"):
+            items += [("check_deviceset", (ds, checker_options.power_and_ground_names)) for ds in Swoop.From(library).get_devicesets()]
+        return items
+
+    def check_in_parallel(self, libraries, jobs):
+        # The items are independent, so each library's are cut into runs
+        # that forked workers check with their own ErrorCollectors, about
+        # four runs per job so big libraries are spread over all of them.
+        # The findings are merged back in the order a serial run would
+        # produce them.  Fixes change the libraries, and findings are
+        # aggregated across the whole run, so neither happens here.
+        items = [self.library_items(library) for name, library in libraries]
+        size = max(1, sum(len(i) for i in items) // (jobs * 4))
+        runs = [(n, start) for n in range(len(items)) for start in range(0, len(items[n]), size)]
+
+        errors = self.errors
+
+        def run(r):
+            n, start = r
+            self.errors = errors.child()
+            try:
+                with NestedError(self.errors, libraries[n][0]):
+                    self.run_library_items(items[n][start:start + size])
+                self.errors.flush()
+                return n, self.errors.dump_json()
+            finally:
+                self.errors = errors
+
+        found = collections.defaultdict(list)
+        for n, dumped in fork_map(run, runs, jobs):
+            found[n].append(dumped)
+
+        for n, (name, library) in enumerate(libraries):
+            if errors.cancelled:
+                return
+            with NestedError(errors, name):
+                self.examined(name)
+            for dumped in found[n]:
+                if errors.cancelled:
+                    return
+                errors.merge(dumped)
+
+    @rule("lbr-symbols", "Symbol pins, names and layers", covers=["symbols"])
     def check_symbol(self, s, power_and_ground):
 
         with NestedError(self.errors, s):
             for p in Swoop.From(s).get_pins():
                 if "$" in p.get_name():
-                    self.warn(u"Pin '{}' has '$' in name.  Give your pins nice names.".format(p.get_name()), inexcusable=True)
+                    self.warn(u"Pin '{}' has '$' in name.  Give your pins nice names.", p.get_name(), inexcusable=True, cause=s)
 
                 with NestedError(self.errors, p):
                     if not self.is_aligned(p.get_x(), 2.54) or not self.is_aligned(p.get_y(), 2.54):
-                        self.error(u"Pin {} is not aligned to the 0.1\" grid. ({}, {})".format(p.get_name(), p.get_x(), p.get_y()), inexcusable=True)
+                        self.error(u"Pin {} is not aligned to the 0.1\" grid. ({}, {})", p.get_name(), p.get_x(), p.get_y(), inexcusable=True, cause=s)
 
             if s.get_name() not in power_and_ground + checker_options.symbols_that_need_no_name:
                 names = Swoop.From(s).get_drawing_elements().with_type(Swoop.Text).filtered_by(lambda x: x.get_text().upper() == ">NAME")
@@ -60,14 +124,14 @@ class LibraryLint(Checker):
                     self.warn(u"Symbol is missing '>NAME'. Every schematic symbol needs a '>NAME' in layer 'Names' so the name of the part is visible in schematic.")
                 elif not names.with_layer("Names"):
                     if self.fix:
-                        names.set_layer("Names")
+                        self.fixes.set(names, layer="Names")
                     else:
                         self.warn(u"'>NAME' is in the wrong layer ('{}').  Should be in 'Names'.".format(", ".join(names.get_layer())), inexcusable=True)
 
             values = Swoop.From(s).get_drawing_elements().with_type(Swoop.Text).filtered_by(lambda x: x.get_text().upper() == str(">VALUE"))
             if values.without_layer("Values"):
                 if self.fix:
-                    values.set_layer("Values")
+                    self.fixes.set(values, layer="Values")
                 else:
                     self.warn(u"'>VALUE' is in the wrong layer ('{}').  Should be in 'Values'.".format(", ".join(values.get_layer())), inexcusable=True)
 
@@ -75,7 +139,7 @@ class LibraryLint(Checker):
 
             if names.without_layer("Names"):
                 if self.fix:
-                    names.set_layer("Names")
+                    self.fixes.set(names, layer="Names")
                 else:
                     self.warn(u"'>NAME' is in the wrong layer ('{}').  Should be in 'Names'.".format(", ".join(names.get_layer())), inexcusable=True)
 
@@ -89,6 +153,7 @@ class LibraryLint(Checker):
 
 
 
+    @rule("lbr-devicesets", "Device gates, values and required attributes", covers=["devicesets", "symbols", "packages"])
     def check_deviceset(self, ds, power_and_ground):
         with NestedError(self.errors, ds):
             gates = Swoop.From(ds).get_gates()
@@ -115,6 +180,12 @@ class LibraryLint(Checker):
                 if not ds.get_uservalue() and value_labels > 0:
                     self.warn(u"Device does not have user value (look for a check box at the bottom of the device editor window), but package for variant '{}' includes '>VALUE'.  This means the package name will appear on the board, which is probably not what you want.".format(device.get_name()))
 
+            if self.fix:
+                for t in Swoop.From(ds).get_devices().get_technologies():
+                    for a in self.required_deviceset_attributes:
+                        if not t.get_attribute(a) or not t.get_attribute(a).get_value():
+                            self.fixes.add(t, "attribute", "Attribute", name=a, value="Unknown")
+
             for d in ds.get_devices():
                 if d.get_package() is not None:
                     with NestedError(self.errors, d):
@@ -124,10 +195,12 @@ class LibraryLint(Checker):
                             continue
                         for a in self.required_deviceset_attributes:
                             if t.get_attribute(a) is None or not t.get_attribute(a).get_value():
-                                self.warn(u"Missing required attribute '{}'".format(a), inexcusable=True)
+                                if not self.fix:
+                                    self.warn(u"Missing required attribute '{}'".format(a), inexcusable=True)
                             elif not t.get_attribute(a).get_constant():
                                 self.warn(u"Attribute '{}' should be constant.".format(a), inexcusable=True)
 
+    @rule("lbr-packages", "Package text, layers, keepout and placement drawings", covers=["packages"])
     def check_package(self, p):
         silkscreen_layers = ["tName",  "tPlace", "tValues", "bPlace", "bNames", "bValues"]
 
@@ -144,26 +217,26 @@ class LibraryLint(Checker):
 
             for q in p.get_pads() + p.get_smds():
                 if "$" in q.get_name():
-                    self.warn(u"Pad/SMD '{}' has '$' in name.  Give your pads and SMDs nice names.".format(q.get_name()), inexcusable=True)
+                    self.warn(u"Pad/SMD '{}' has '$' in name.  Give your pads and SMDs nice names.", q.get_name(), inexcusable=True, cause=p)
 
             for t in elements.with_type(Swoop.Text):
                 if t.get_text().upper() == ">NAME" and t.get_layer() not in ["tNames", "bNames"]:  # , "tDocu", "bDocu"]:
                     if self.fix:
-                        t.set_layer("tNames")
+                        self.fixes.set(t, layer="tNames")
                     else:
                         self.warn(
                             u"'>NAME' in text object in layer {} instead of tNames or bNames".format(t.get_layer()))
 
                 if t.get_text().upper() == ">VALUE" and t.get_layer() not in ["tValues", "bValues"]:  # , "tDocu", "bDocu"]:
                     if self.fix:
-                        t.set_layer("tValues")
+                        self.fixes.set(t, layer="tValues")
                     else:
                         self.warn(
                             u"'>VALUE' in text object in layer {} instead of tValues or bValues".format(t.get_layer()))
 
                 if t.get_text().upper() in [">NAME", ">VALUE"] and (t.get_size() < checker_options.silkscreen_min_size or t.get_ratio() != checker_options.silkscreen_ratio or t.get_font() not in checker_options.silkscreen_fonts):
                     if self.fix:
-                        t.set_size(checker_options.silkscreen_min_size).set_ratio(checker_options.silkscreen_ratio).set_font(checker_options.silkscreen_fonts[0])
+                        self.fixes.set(t, size=checker_options.silkscreen_min_size, ratio=checker_options.silkscreen_ratio, font=checker_options.silkscreen_fonts[0])
                     else:
                         self.warn(
                             u"'{}' in text object has wrong geometry (size={}mm, ratio={}%, font={}).  Should be {}mm, {}%, and one of these fonts that will render properly on the board during manufacturing: {}.".format(
@@ -174,22 +247,25 @@ class LibraryLint(Checker):
                                 ", ".join(checker_options.silkscreen_fonts)), inexcusable=True)
 
                 if t.get_layer() in ["tNames", "bNames"] and t.get_text().upper() != ">NAME":
-                    self.warn(u"Layer {} should only contain text items with the '>NAME', found '{}'".format(t.get_layer(), t.get_text()), inexcusable=True)
+                    self.warn(u"Layer {} should only contain text items with the '>NAME', found '{}'", t.get_layer(), t.get_text(), inexcusable=True, cause=p)
 
                 if t.get_layer() in ["tValues", "bValues"] and t.get_text().upper() != ">VALUE":
-                    self.warn(u"Layer {} should only contain text items with '>VALUE', found '{}'".format(t.get_layer(), t.get_text()), inexcusable=True)
+                    self.warn(u"Layer {} should only contain text items with '>VALUE', found '{}'", t.get_layer(), t.get_text(), inexcusable=True, cause=p)
 
                 if t.get_layer() in silkscreen_layers:
 
                     if t.get_size() < checker_options.silkscreen_min_size:
-                        self.warn(u"Text '{}' in layer {} is too small ({}mm).  To be legible on the board it should be at least {}mm.".format(t.get_text(), t.get_layer(),
-                                                                                     t.get_size(), checker_options.silkscreen_min_size), inexcusable=True)
+                        self.warn(u"Text '{}' in layer {} is too small ({}mm).  To be legible on the board it should be at least {}mm.", t.get_text(), t.get_layer(),
+                                  t.get_size(), checker_options.silkscreen_min_size, inexcusable=True, cause=p)
 
                     if t.get_font() != "vector":
-                        self.warn(u"Text '{}' in layer {} is not in the vector font.  The other fonts don't render properly on the board.".format(t.get_text(), t.get_layer()), inexcusable=True)
+                        self.warn(u"Text '{}' in layer {} is not in the vector font.  The other fonts don't render properly on the board.", t.get_text(), t.get_layer(), inexcusable=True, cause=p)
 
-            if elements.without_type(Swoop.Hole).with_layer("tKeepout").count() == 0 and elements.count() < 50:
-                self.error("Nothing in tKeepout.  All packages should include a keepout area to prevent parts from overlapping.")
+            if elements.without_type(Swoop.Hole).with_layer("tKeepout").count() == 0:
+                if self.fix:
+                    self.fixes.add(p, "drawing_element", "Wire", x1=0, y1=0, x2=0, y2=0, width=1, layer="tKeepout")
+                elif elements.count() < 50:
+                    self.error("Nothing in tKeepout.  All packages should include a keepout area to prevent parts from overlapping.")
 
             if elements.without_type(Swoop.Hole).with_layer("tPlace").count() == 0 and elements.count() < 50:
                 self.error("Nothing in tPlace.  Packages should include lines or shapes showing how the part should be placed on the board.  For ICs this should precisely show the location of four courners of the part.  For polarized parts, it should illustrate the polarity.  For other parts a full or partial outline of the part is sufficient.")
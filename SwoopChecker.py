@@ -1,13 +1,25 @@
+import array
 import binascii
+import collections
+import fnmatch
+import math
 import operator
 import re
-from inspect import getframeinfo, stack
+import string
+import sys
+import time
 import importlib
 
 import Swoop
 
 from intersect import doIntersect, Point
 from Bunch import Bunch
+from parallel import fork_map
+from timelimit import time_limit, Timeout
+from fixes import FixPlan
+from queries import DocumentQueries, part_keys
+from catalog import LibraryCatalog
+import registry
 
 def mm_to_mil(mm):
     return 39.3701 * mm
@@ -46,32 +58,97 @@ html_output = True
 
 
 
+class Ref(object):
+    # A design object named in a message.  Only the name and kind ('part',
+    # 'net', 'pin' or None) are kept, so findings don't keep the design
+    # alive, and it's rendered as text or HTML when the message is.
+    __slots__ = ["name", "kind"]
+
+    def __init__(self, p, type=None):
+        self.name = p if isinstance(p, basestring) else p.get_name()
+        self.kind = type or ref_kind(p)
+
+    def render(self, html):
+        if html and self.kind:
+            return u"<span class='swoop-lint-{}'>{}</span>".format(self.kind, self.name)
+        return self.name
+
+
+class RefList(object):
+    # Several Refs rendered as one list.
+    __slots__ = ["refs", "sep"]
+
+    def __init__(self, items, type=None, sep=" "):
+        self.refs = [Ref(i, type) for i in items]
+        self.sep = sep
+
+    def render(self, html):
+        return self.sep.join(r.render(html) for r in self.refs)
+
+
+def ref_kind(p):
+    if isinstance(p, (Swoop.Part, Swoop.Element)):
+        return "part"
+    elif isinstance(p, (Swoop.Net, Swoop.Signal)):
+        return "net"
+    elif isinstance(p, Swoop.Pin):
+        return "pin"
+    return None
+
+
+class Message(object):
+    # A finding's message, kept as a template and its arguments until
+    # someone needs the text.  Parts, nets and pins among the arguments are
+    # captured as Refs.
+    __slots__ = ["template", "args", "kwargs"]
+
+    def __init__(self, template, args=(), kwargs=None):
+        self.template = template
+        self.args = tuple(Ref(a) if ref_kind(a) else a for a in args)
+        self.kwargs = dict((k, Ref(v) if ref_kind(v) else v) for k, v in kwargs.items()) if kwargs else None
+
+    def render(self, html):
+        r = lambda a: a.render(html) if isinstance(a, (Ref, RefList, Message)) else a
+        return self.template.format(*[r(a) for a in self.args], **dict((k, r(v)) for k, v in (self.kwargs or {}).items()))
+
+
+_placeholders = {}
+
+def has_placeholders(template):
+    # Whether a message has any {} fields, remembered per template.
+    try:
+        return _placeholders[template]
+    except KeyError:
+        r = _placeholders[template] = any(field is not None for text, field, spec, conversion in string.Formatter().parse(template))
+        return r
+
+
+def render_message(message, html=None):
+    if html is None:
+        html = html_output
+    if isinstance(message, Message):
+        return message.render(html)
+    return message
+
+
 def output_format(p, type=None):
-    if isinstance(p, str):
-        name = p
-    else:
-        name = p.get_name()
-
-    if html_output:
-        if isinstance(p, Swoop.Part) or type == "part":
-            return "<span class='swoop-lint-part'>{}</span>".format(name)
-        elif isinstance(p, Swoop.Element) or type == "part":
-            return "<span class='swoop-lint-part'>{}</span>".format(name)
-        elif isinstance(p, Swoop.Net) or isinstance(p, Swoop.Signal) or type == "net":
-            return "<span class='swoop-lint-net'>{}</span>".format(name)
-        elif isinstance(p, Swoop.Pin) or type == "pin":
-            return "<span class='swoop-lint-pin'>{}</span>".format(name)
-        else:
-            return name
-    else:
-        return name
+    return Ref(p, type).render(html_output)
 
 
 class ChainLink(object):
+    # Links turn their criteria into a list of tests when they're made,
+    # cheapest first, and match() stops at the first one that fails.
+    # Custom select functions go last.
 
     def __init__(self):
         super(object, self).__init__()
 
+    def match(self, x):
+        for test in self.tests:
+            if not test(x):
+                return False
+        return True
+
 
 class Pin(ChainLink):
     def __init__(self, name=None, select=None, description=None):
@@ -79,7 +156,16 @@ class Pin(ChainLink):
         self.name = listify(name)
         self.select = select
         self.description = description
+        self.tests = self.compile()
 
+    def compile(self):
+        tests = []
+        if self.name:
+            names = frozenset(self.name)
+            tests.append(lambda pin: pin.get_pin() in names)
+        if self.select:
+            tests.append(self.select)
+        return tests
 
     def __str__(self):
         if html_output:
@@ -98,10 +184,6 @@ class Pin(ChainLink):
     def html(self):
         return "<span class='swoop-lint-pin'>{}</span>".format(self.get_string())
 
-    def match(self, pin):
-        return all([not self.name or pin.get_pin() in self.name,
-                    not self.select or self.select(pin)])
-
 
 def listify(l):
     if l is None:
@@ -120,6 +202,28 @@ class Part(ChainLink):
         self.description = description
         self.select = select
         self.value = listify(value)
+        self.tests = self.compile()
+
+    def compile(self):
+        tests = []
+        if self.part:
+            parts = frozenset(self.part)
+            tests.append(lambda part: part in parts)
+        if self.deviceset:
+            devicesets = frozenset(self.deviceset)
+            tests.append(lambda part: part.get_deviceset() in devicesets)
+        if self.device:
+            devices = frozenset(self.device)
+            tests.append(lambda part: part.get_device() in devices)
+        if self.longname:
+            longnames = frozenset(self.longname)
+            tests.append(lambda part: part_keys(part)[0] in longnames)
+        if self.value:
+            values = frozenset(v.upper() for v in self.value)
+            tests.append(lambda part: part_keys(part)[1] in values)
+        if self.select:
+            tests.append(self.select)
+        return tests
 
     def get_string(self):
         if self.name:
@@ -147,14 +251,6 @@ class Part(ChainLink):
     def html(self):
         return "<span class='swoop-lint-part'>{}</span>".format(self.get_string())
 
-    def match(self, part):
-        return all([not self.part or part in self.part,
-                    not self.longname or part.get_deviceset() + part.get_device() in self.longname,
-                    not self.deviceset or part.get_deviceset() in self.deviceset,
-                    not self.device or part.get_device() in self.device,
-                    not self.select or self.select(part),
-                    not self.value or (part.get_value() and part.get_value().upper() in map(lambda x:x.upper(), self.value))])
-
 
 class Net(ChainLink):
     def __init__(self, name=None,select=None, net=None, description=None):
@@ -163,6 +259,17 @@ class Net(ChainLink):
         self.select = select
         self.net = net
         self.description = description
+        self.tests = self.compile()
+
+    def compile(self):
+        tests = []
+        if self.net:
+            tests.append(lambda net: net is self.net)
+        if self.name:
+            tests.append(lambda net: net.get_name() == self.name)
+        if self.select:
+            tests.append(self.select)
+        return tests
 
     def get_string(self):
         if self.name:
@@ -183,11 +290,6 @@ class Net(ChainLink):
     def html(self):
         return "<span class='swoop-lint-net'>{}</span>".format(self.get_string())
 
-    def match(self, net):
-        return all([not self.name or self.name == net.get_name(),
-                    not self.select or self.select(net),
-                    not self.net or self.net == net])
-
 
 def str_pattern(path=(), pattern=()):
     if path:
@@ -214,11 +316,182 @@ class FailedMatchException(Exception):
     pass
 
 
+def rule(rule_id, description="", uses=(), streamable=False, covers=()):
+    # Tag a check_* method with a stable rule ID.  Findings recorded while it
+    # runs carry the ID, and it is what --enable/--disable select on.  'uses'
+    # names the analyses (e.g. 'connectivity') of the checker's design the
+    # rule looks at; those that several rules about to run in parallel use
+    # are built before they're forked.
+    # 'streamable' rules only need what boardscan.BoardScan reads from a
+    # board, so they can run without parsing it into Swoop objects.  'covers'
+    # names the kinds of design objects ('parts', 'nets', 'elements',
+    # 'signals', 'plain', 'symbols', 'packages', 'devicesets') its findings
+    # depend on; --since skips it if none of them changed.  Rules that don't
+    # say always run.
+    def decorate(f):
+        f.rule_id = rule_id
+        f.rule_description = description
+        f.rule_uses = list(uses)
+        f.rule_streamable = streamable
+        f.rule_covers = list(covers)
+        return f
+    return decorate
+
+def rule_selected(rule_id, options):
+    # 'enable' and 'disable' are lists of rule IDs or fnmatch patterns
+    # ('sch-*').  If 'enable' is given, only those rules run.
+    enable = options.get("enable")
+    disable = options.get("disable")
+    if enable and not any(fnmatch.fnmatchcase(rule_id, p) for p in enable):
+        return False
+    if disable and any(fnmatch.fnmatchcase(rule_id, p) for p in disable):
+        return False
+    return True
+
+
+# Analyses are views of a design that take real work to build: its
+# connectivity, spatial indexes, wire tables.  Each is built the first time a
+# checker asks its CheckerContext for it and shared by every checker with the
+# same context.  Checkers can add their own with @analysis("name"), on a
+# function that takes the context and a document and returns the analysis;
+# ctx.get("name", doc) then builds or reuses it.  Analyses are memoized with
+# the document's queries, so applying fixes to it throws them away too.
+analyses = {}
+
+# The modules that define the built-in analyses, imported the first time one
+# is asked for.
+analysis_modules = {"connectivity": "connectivity",
+                    "spatial": "spatial"}
+
+def register_analysis(name, build):
+    analyses[name] = build
+
+def analysis(name):
+    def decorate(f):
+        register_analysis(name, f)
+        return f
+    return decorate
+
+
+class AnalysisStats(object):
+    __slots__ = ["builds", "hits", "seconds"]
+
+    def __init__(self):
+        self.builds = 0
+        self.hits = 0
+        self.seconds = 0.0
+
+    def add(self, other):
+        self.builds += other.builds
+        self.hits += other.hits
+        self.seconds += other.seconds
+
+
+def dump_stats(stats):
+    # {name: AnalysisStats} as plain tuples, to send back from workers.
+    return dict((name, (s.builds, s.hits, s.seconds)) for name, s in stats.items())
+
+def merge_stats(stats, dumped):
+    for name, (builds, hits, seconds) in dumped.items():
+        s = stats[name]
+        s.builds += builds
+        s.hits += hits
+        s.seconds += seconds
+
+
+class WireTable(object):
+    # The wires of a design's nets (schematics) or signals (boards), in
+    # document order and by layer.
+
+    def __init__(self, wires):
+        self.wires = wires
+        self.layers = {}
+        for w in wires:
+            self.layers.setdefault(w.get_layer(), []).append(w)
+
+    def on_layer(self, layer):
+        return Swoop.From(self.layers.get(layer, []))
+
+    def routed(self):
+        return Swoop.From([w for w in self.wires if w.get_width() != 0.0])
+
+    def unrouted(self):
+        return Swoop.From([w for w in self.wires if w.get_width() == 0.0])
+
+
+@analysis("wires")
+def wire_table(ctx, doc):
+    if isinstance(doc, Swoop.BoardFile):
+        return WireTable(ctx.queries(doc).select("signals", "wires").unpack())
+    return WireTable(ctx.queries(doc).select("sheets", "nets", "segments", "wires").unpack())
+
+
 class CheckerContext(object):
+    # Shared by the checkers that run on the same files.
+
     def __init__(self):
-        pass
+        self.documents = {}     # id(document) -> DocumentQueries
+        self.catalogs = {}      # ids of the libraries -> LibraryCatalog
+        self.stats = collections.defaultdict(AnalysisStats)
+
+    def queries(self, doc):
+        q = self.documents.get(id(doc))
+        if q is None or q.doc is not doc:
+            q = self.documents[id(doc)] = DocumentQueries(doc)
+        return q
+
+    def get(self, name, doc):
+        if name not in analyses and name in analysis_modules:
+            importlib.import_module(analysis_modules[name])
+        if name not in analyses:
+            raise KeyError("No analysis called '{}'".format(name))
+        stats = self.stats[name]
+        q = self.queries(doc)
+        key = ("analysis", name)
+        if key in q.cache:
+            stats.hits += 1
+            return q.cache[key]
+
+        start = time.time()
+        r = q.cache[key] = analyses[name](self, doc)
+        stats.builds += 1
+        stats.seconds += time.time() - start
+        return r
+
+    # The built-in analyses.
+
+    def connectivity(self, sch):
+        return self.get("connectivity", sch)
+
+    def spatial(self, brd):
+        return self.get("spatial", brd)
+
+    def wires(self, doc):
+        return self.get("wires", doc)
+
+    def catalog(self, lbrs):
+        # A catalog of these libraries, for checkers run without the one
+        # run_eaglelint_check builds.
+        key = tuple(id(l) for l in lbrs)
+        stats = self.stats["catalog"]
+        if key in self.catalogs:
+            stats.hits += 1
+        else:
+            start = time.time()
+            self.catalogs[key] = LibraryCatalog(lbrs)
+            stats.builds += 1
+            stats.seconds += time.time() - start
+        return self.catalogs[key]
 
 class Checker(object):
+
+    # Names of the rule methods do_check runs, in order.
+    checks = []
+
+    # The attribute holding the design the analyses its rules use are of
+    # ('sch' or 'brd').
+    design = None
+
     def __init__(self, errors, fix, context=None, sch=None, brd=None, lbrs=None, options=None):
         assert isinstance(errors, ErrorCollector)
         self.errors = errors
@@ -232,22 +505,232 @@ class Checker(object):
         else:
             self.options = options
 
+        # Fixers add their edits to this plan rather than changing the
+        # design.  The plan is applied after all the checks have run: by
+        # run_eaglelint_check if it passed one in, or by check() if this
+        # checker made its own (which the checkers nested in it share).
+        self.fixes = self.options.get("fixes")
+        self.owns_fixes = self.fixes is None
+        if self.owns_fixes:
+            self.fixes = FixPlan()
+            self.options = dict(self.options, fixes=self.fixes)
+
+        # Parts are looked up in this index of the libraries.
+        # run_eaglelint_check builds one for the whole run.
+        self.catalog = self.options.get("catalog")
+        if self.catalog is None:
+            self.catalog = self.ctx.catalog(self.lbrs)
+
     def do_check(self):
         pass
 
+    def queries(self, doc):
+        # Memoized Swoop queries over doc (see queries.py).
+        return self.ctx.queries(doc)
+
     def check(self):
+        # options["file_budget"] bounds the time for all the checks on a
+        # design, including the checkers nested in this one, which inherit
+        # the deadline through options.
+        budget = self.options.get("file_budget")
+        if budget and "deadline" not in self.options:
+            self.options = dict(self.options, deadline=time.time() + budget, out_of_time=set())
         self.do_check()
+        if self.fix and self.owns_fixes:
+            self.fixes.apply()
+            for filename, edit, reason in self.fixes.conflicts:
+                with self.errors.nest(filename):
+                    self.errors.record_warning(None, u"Couldn't apply fix ({}): {}".format(edit, reason))
+        self.errors.flush()
         return (self.errors, self.ctx)
 
-    def error(self, message, inexcusable=False):
-        caller = getframeinfo(stack()[1][0])
-        self.errors.record_error(self.sch, message, note="{}:{}".format(caller.filename.split("/")[-1], caller.lineno), inexcusable=inexcusable)
-    def info(self, message):
-        caller = getframeinfo(stack()[1][0])
-        self.errors.record_info(self.sch, message, note="{}:{}".format(caller.filename.split("/")[-1], caller.lineno))
-    def warn(self, message, inexcusable=False):
-        caller = getframeinfo(stack()[1][0])
-        self.errors.record_warning(self.sch, message, note="{}:{}".format(caller.filename.split("/")[-1], caller.lineno), inexcusable=inexcusable)
+    @classmethod
+    def get_rules(cls):
+        return [getattr(cls, c) for c in cls.checks if hasattr(getattr(cls, c), "rule_id")]
+
+    @classmethod
+    def needs_board_tree(cls, options):
+        # Whether boards have to be parsed into Swoop objects for this
+        # checker, rather than scanned.  Only checkers whose enabled rules
+        # are all streamable can do without.
+        rules = cls.get_rules()
+        return not rules or any(rule_selected(r.rule_id, options) and not r.rule_streamable for r in rules)
+
+    def rule_enabled(self, rule_id):
+        return rule_id is None or rule_selected(rule_id, self.options)
+
+    def check_enabled(self, check):
+        return self.rule_enabled(getattr(getattr(self, check), "rule_id", None))
+
+    def has_enabled_rules(self):
+        # Rules --since skipped (options["unchanged_rules"]) count: their
+        # findings are carried over, so the checker still says what it
+        # examined, as in a full run.
+        rules = self.get_rules()
+        unchanged = self.options.get("unchanged_rules") or []
+        return not rules or any(self.rule_enabled(r.rule_id) or r.rule_id in unchanged for r in rules)
+
+    def rule_budget(self):
+        # Seconds the next rule may run for, or None for no limit.  Fixes
+        # are never interrupted halfway through.
+        if self.fix:
+            return None
+        budgets = []
+        if self.options.get("rule_budget"):
+            budgets.append(self.options["rule_budget"])
+        if self.options.get("deadline"):
+            budgets.append(self.options["deadline"] - time.time())
+        return min(budgets) if budgets else None
+
+    def current_file(self):
+        if self.errors.path:
+            return self.errors.path[0]
+        for d in [self.brd, self.sch]:
+            if d:
+                return d.get_filename()
+        return "?"
+
+    def run_rule(self, check, *args):
+        self.run_rule_items(check, [args])
+
+    def run_rule_items(self, check, items):
+        # Run a rule method once for each tuple of arguments in items (e.g.
+        # on every symbol in a library), all under one budget.  A rule that
+        # runs past its budget is abandoned: the findings of the item it was
+        # on are dropped, the rest of its items are skipped, and an Info says
+        # so, once.
+        f = getattr(self, check)
+        previous = self.errors.rule
+        self.errors.rule = getattr(f, "rule_id", previous)
+        try:
+            budget = self.rule_budget()
+            if budget is None:
+                for args in items:
+                    if self.errors.cancelled:
+                        break
+                    f(*args)
+                return
+
+            name = self.errors.rule or check
+            if budget <= 0:
+                if name not in self.options["out_of_time"]:
+                    self.options["out_of_time"].add(name)
+                    self.info(u"Rule {} skipped: ran out of time on {}".format(name, self.current_file()))
+                return
+
+            mark = None
+            try:
+                with time_limit(budget):
+                    for args in items:
+                        if self.errors.cancelled:
+                            break
+                        mark = self.errors.mark()
+                        f(*args)
+                        self.errors.commit(mark)
+                        mark = None
+            except Timeout:
+                if mark is not None:
+                    self.errors.rollback(mark)
+                    mark = None
+                self.info(u"Rule {} skipped after {:g}s on {}".format(name, round(budget, 2), self.current_file()))
+            finally:
+                if mark is not None:
+                    self.errors.commit(mark)
+        finally:
+            self.errors.rule = previous
+
+    def run_checks(self, checks):
+        # Run check_* methods by name.  With options["jobs"] > 1 the checks
+        # run concurrently in forked copies of this checker, each with its
+        # own ErrorCollector, and the findings are merged back in the order a
+        # serial run would produce.  Fixes mutate the design, so they are
+        # always serial.
+        # Disabled rules are skipped outright rather than filtered after.
+        checks = [c for c in checks if self.check_enabled(c)]
+
+        jobs = self.options.get("jobs") or 1
+        if self.fix or jobs <= 1:
+            for c in checks:
+                if self.errors.cancelled:
+                    break
+                self.run_rule(c)
+                self.errors.flush()
+            return
+
+        self.build_analyses(checks)
+
+        errors = self.errors
+        stats = self.ctx.stats
+
+        def run(c):
+            # The analyses a worker builds are counted afresh and added
+            # to the parent's counts.
+            self.errors = errors.child()
+            self.ctx.stats = collections.defaultdict(AnalysisStats)
+            try:
+                self.run_rule(c)
+                self.errors.flush()
+                return self.errors.dump_json(), dump_stats(self.ctx.stats)
+            finally:
+                self.errors = errors
+                self.ctx.stats = stats
+
+        for dumped, built in fork_map(run, checks, jobs):
+            merge_stats(stats, built)
+            if errors.cancelled:
+                break
+            errors.merge(dumped)
+
+    def build_analyses(self, checks):
+        # Build the analyses more than one of these checks uses, so the
+        # workers they're forked into share one copy instead of each
+        # building its own.
+        doc = getattr(self, self.design) if self.design else None
+        if doc is None:
+            return
+        uses = collections.Counter(name for c in checks for name in getattr(getattr(self, c), "rule_uses", []))
+        for name in sorted(uses):
+            if uses[name] > 1:
+                self.ctx.get(name, doc)
+
+    # error(), warn() and info() take either a finished message or a
+    # template and its arguments, e.g. self.warn("Part {} is odd", part).
+    # Templates are only rendered when the finding is output or hashed.
+    # cause= names the root cause of a finding (e.g. the symbol every
+    # misplaced pin comes from) so aggregation can group by it.
+
+    def caller(self):
+        # Interned, since the same few call sites record most findings.
+        f = sys._getframe(2)
+        return intern("{}:{}".format(f.f_code.co_filename.split("/")[-1], f.f_lineno))
+
+    def make_message(self, message, args, kwargs, positional_inexcusable=True):
+        # (message, inexcusable).  Older checkers pass inexcusable
+        # positionally after a finished message, self.error("...", True), and
+        # that still works; any other arguments to a message without
+        # placeholders are a mistake.
+        if not args and not kwargs:
+            return message, False
+        if not has_placeholders(message):
+            if positional_inexcusable and len(args) == 1 and not kwargs and isinstance(args[0], bool):
+                return message, args[0]
+            raise TypeError(u"Message has no placeholders for its arguments: {}".format(message))
+        return Message(message, args, kwargs), False
+
+    def error(self, message, *args, **kwargs):
+        inexcusable = kwargs.pop("inexcusable", False)
+        cause = kwargs.pop("cause", None)
+        message, positional = self.make_message(message, args, kwargs)
+        self.errors.record_error(self.sch, message, note=self.caller(), inexcusable=inexcusable or positional, cause=cause)
+    def info(self, message, *args, **kwargs):
+        cause = kwargs.pop("cause", None)
+        message, positional = self.make_message(message, args, kwargs, positional_inexcusable=False)
+        self.errors.record_info(self.sch, message, note=self.caller(), cause=cause)
+    def warn(self, message, *args, **kwargs):
+        inexcusable = kwargs.pop("inexcusable", False)
+        cause = kwargs.pop("cause", None)
+        message, positional = self.make_message(message, args, kwargs)
+        self.errors.record_warning(self.sch, message, note=self.caller(), inexcusable=inexcusable or positional, cause=cause)
 
     def do_match(self, path, pattern, solutions):
         if len(pattern) == 0:
@@ -263,13 +746,9 @@ class Checker(object):
                 net_link = pattern[1]
                 assert isinstance(net_link, Net), "{}".format(net_link)
 
-                nets = (Swoop.From(self.sch)
-                        .get_sheets()
-                        .get_nets()
-                        .filtered_by(lambda x: net_link.match(x))
-                        .get_segments()
-                        .get_pinrefs()
-                        .filtered_by(lambda x: pin_link.match(x) and x.get_part() == tail.get_name())
+                refs = self.queries(self.sch).pinrefs_by_part().get(tail.get_name(), [])
+                nets = (Swoop.From(refs)
+                        .filtered_by(lambda x: pin_link.match(x) and net_link.match(x.get_parent().get_parent()))
                         .get_parent().get_parent())
                 for n in nets:
                     self.do_match(path + [n], pattern[2:], solutions)
@@ -284,15 +763,11 @@ class Checker(object):
                 part_link = pattern[3]
                 assert isinstance(part_link, Part), "Bad pattern: {}".format(str_pattern(pattern=pattern))
 
-                nets = (Swoop.From(self.sch)
-                        .get_sheets()
-                        .get_nets()
-                        .filtered_by(lambda x: net_link.match(x))
-                        .get_segments()
-                        .get_pinrefs()
-                        .filtered_by(lambda x: x.get_part() == tail.get_name())
+                refs = self.queries(self.sch).pinrefs_by_part().get(tail.get_name(), [])
+                nets = (Swoop.From(refs)
                         .get_parent()
                         .get_parent()
+                        .filtered_by(lambda x: net_link.match(x))
                         .unique())
 
                 for n in nets:
@@ -324,9 +799,9 @@ class Checker(object):
 
         link = pattern[0]
         if isinstance(link, Part):
-            options = Swoop.From(self.sch).get_parts().filtered_by(lambda x: link.match(x))
+            options = self.queries(self.sch).select("parts").filtered_by(lambda x: link.match(x))
         elif isinstance(link, Net):
-            options = Swoop.From(self.sch).get_sheets().get_nets().filtered_by(lambda x: link.match(x))
+            options = self.queries(self.sch).select("sheets", "nets").filtered_by(lambda x: link.match(x))
         else:
             raise Exception("First link in pattern must be Net or Part: {}".format(link))
 
@@ -395,18 +870,10 @@ class Checker(object):
                                    Point(w1x2, w1y2),
                                    Point(w2x1, w2y1),
                                    Point(w2x2, w2y2)):
-                        self.error(
-                            "The segment of {w1} from ({w1x1}, {w1y1}) to ({w1x2}, {w1y2}) intersects with the segment of {w2} from ({w2x1}, {w2y1}) to ({w2x2}, {w2y2}).".format(
-                                w1=output_format(get_net(w1)),
-                                w1x1=w1x1,
-                                w1y1=w1y1,
-                                w1x2=w1x2,
-                                w1y2=w1y2,
-                                w2x1=w2x1,
-                                w2y1=w2y1,
-                                w2x2=w2x2,
-                                w2y2=w2y2,
-                                w2=output_format(get_net(w2))))
+                        self.error(u"The segment of {w1} from ({w1x1}, {w1y1}) to ({w1x2}, {w1y2}) intersects with the segment of {w2} from ({w2x1}, {w2y1}) to ({w2x2}, {w2y2}).",
+                                   w1=Ref(get_net(w1)), w1x1=w1x1, w1y1=w1y1, w1x2=w1x2, w1y2=w1y2,
+                                   w2=Ref(get_net(w2)), w2x1=w2x1, w2y1=w2y1, w2x2=w2x2, w2y2=w2y2,
+                                   cause=get_net(w1))
 
     def is_aligned(self, d, grid):
         x = round(d / grid, 0)
@@ -432,7 +899,17 @@ class CheckerSequence(Checker):
 
     def do_check(self):
         for Checker in self.checkers:
-            Checker(sch=self.sch, errors=self.errors, context=self.ctx, brd=self.brd, lbrs=self.lbrs, fix=self.fix).check()
+            if self.errors.cancelled:
+                break
+            if isinstance(Checker, basestring):
+                r = registry.lookup(Checker)
+                if not r.applies(sch=self.sch, brd=self.brd, lbrs=self.lbrs):
+                    continue
+                Checker = r.load()
+            c = Checker(sch=self.sch, errors=self.errors, context=self.ctx, brd=self.brd, lbrs=self.lbrs, fix=self.fix, options=self.options)
+            # Don't even set up checkers whose rules are all disabled.
+            if c.has_enabled_rules():
+                c.check()
 
 def CheckSet(checkers):
     class C(CheckerSequence):
@@ -449,16 +926,90 @@ def count_pins(part):
     else:
         return len(gates[0].find_symbol().get_pins())
 
-def bounding_box(items):
+def _box_items(items):
     if isinstance(items, Swoop.From):
-        items = items.unpack()
-    elif not isinstance(items, list):
-        items = [items]
+        return items.unpack()
+    elif not isinstance(items, (list, tuple)):
+        return [items]
+    return items
+
+def _extend_box(box, points):
+    x1, y1, x2, y2 = box
+    for x, y in points:
+        if x < x1:
+            x1 = x
+        if x > x2:
+            x2 = x
+        if y < y1:
+            y1 = y
+        if y > y2:
+            y2 = y
+    return x1, y1, x2, y2
+
+_empty_box = (float("inf"), float("inf"), float("-inf"), float("-inf"))
 
-    bounds_points = reduce(lambda x,y: x+y, map(lambda x:x.get_bounds_points(), items), [])
-    xs = map(lambda a: a[0], bounds_points)
-    ys = map(lambda a: a[1], bounds_points)
-    return (min(*xs), min(*ys), max(*xs), max(*ys))
+def bounding_box(items):
+    box = _empty_box
+    for i in _box_items(items):
+        box = _extend_box(box, i.get_bounds_points())
+
+    if box[0] > box[2]:
+        raise ValueError("Can't compute the bounding box of nothing")
+    return box
+
+def bounding_boxes(items):
+    # Per-item boxes as four parallel columns (x1s, y1s, x2s, y2s).  Items
+    # without any geometry get NaN so the columns stay aligned with items.
+    nan = float("nan")
+    columns = (array.array("d"), array.array("d"), array.array("d"), array.array("d"))
+    for i in _box_items(items):
+        box = _extend_box(_empty_box, i.get_bounds_points())
+        if box[0] > box[2]:
+            box = (nan, nan, nan, nan)
+        for c, v in zip(columns, box):
+            c.append(v)
+    return columns
+
+def union_of_boxes(columns):
+    # The box around the boxes bounding_boxes() found, or None if none of
+    # the items had any geometry.
+    x1s, y1s, x2s, y2s = columns
+    rows = [i for i, x in enumerate(x1s) if x == x]
+    if not rows:
+        return None
+    return (min(x1s[i] for i in rows), min(y1s[i] for i in rows),
+            max(x2s[i] for i in rows), max(y2s[i] for i in rows))
+
+def transform_point(px, py, x=0.0, y=0.0, rotation=0.0, mirrored=False):
+    # Place a point drawn in package/symbol coordinates the way Eagle places
+    # the instance: rotate counter-clockwise, mirror about the y axis, then
+    # translate.  So MR90 takes (1, 0) to (0, 1) and (0, 1) to (1, 0): seen
+    # from the top, mirrored parts turn clockwise as their angle grows.
+    # test/overlaps.brd (see test_geometry.py) only comes out right this way.
+    rotation = rotation % 360
+    if rotation == 0:
+        pass
+    elif rotation == 90:
+        px, py = -py, px
+    elif rotation == 180:
+        px, py = -px, -py
+    elif rotation == 270:
+        px, py = py, -px
+    else:
+        c = math.cos(math.radians(rotation))
+        s = math.sin(math.radians(rotation))
+        px, py = px * c - py * s, px * s + py * c
+
+    if mirrored:
+        px = -px
+
+    return px + x, py + y
+
+def transform_box(box, x=0.0, y=0.0, rotation=0.0, mirrored=False):
+    # The axis-aligned box around a placed box.
+    x1, y1, x2, y2 = box
+    corners = [transform_point(px, py, x, y, rotation, mirrored) for px, py in [(x1, y1), (x1, y2), (x2, y1), (x2, y2)]]
+    return _extend_box(_empty_box, corners)
 
 def bounding_box_size(items):
     x1, y1, x2, y2 = bounding_box(items)
@@ -469,15 +1020,31 @@ def bounding_box_area(items):
     return x * y
 
 class Error(object):
-
-    def __init__(self, path, error, level, index, context="", excused=False, inexcusable=False):
-        self.path = path
-        self.error = error
+    # path is a PathNode (or, for findings read back from JSON, a string),
+    # and leaf is the name of the object the finding is about, if any.
+    # Aggregated findings stand for 'count' findings and have a fingerprint
+    # that doesn't depend on how many there were.
+    __slots__ = ["location", "leaf", "rule", "message", "level", "index", "excused", "context", "inexcusable", "count", "fingerprint"]
+
+    def __init__(self, path, error, level, index, context="", excused=False, inexcusable=False, rule=None, leaf=None, count=1, fingerprint=None):
+        self.location = path
+        self.leaf = leaf
+        self.rule = rule
+        self.message = error
         self.level = level
         self.index = index
         self.excused = excused
         self.context = context
         self.inexcusable = inexcusable
+        self.count = count
+        self.fingerprint = fingerprint
+
+    @property
+    def path(self):
+        path = self.location.string if isinstance(self.location, PathNode) else self.location
+        if self.leaf is None:
+            return path
+        return u"{}:{}".format(path, self.leaf)
 
     def _asdict(self):
         return dict(path=self.path,
@@ -486,7 +1053,14 @@ class Error(object):
                     index=self.index,
                     excused=self.excused,
                     context=self.context,
-                    inexcusable=self.inexcusable)
+                    inexcusable=self.inexcusable,
+                    rule=self.rule,
+                    count=self.count,
+                    fingerprint=self.fingerprint)
+
+    @property
+    def error(self):
+        return render_message(self.message)
 
     def get_full_string(self):
         return self.path + self.error
@@ -495,9 +1069,13 @@ class Error(object):
         return u"{}: {} -- {}".format(self.level, self.path, self.error)
 
     def __str__(self):
+        if self.rule:
+            return u"{} ({}, {}:{})".format(self.render_message(), self.rule, self.context, self.hash())
         return u"{} ({}:{})".format(self.render_message(), self.context, self.hash())
 
     def hash(self):
+        if self.fingerprint:
+            return self.fingerprint
         hash_message = self.render_message()
         hash_message = re.sub("[^:].*/", "", hash_message) # Trim path to file, if present
         return "{:08X}".format(abs(binascii.crc32(hash_message)))
@@ -508,6 +1086,148 @@ pretty_print_map={"Deviceset": "Device",
                   }
 
 
+def argument_key(a):
+    # What a message argument says, to tell whether two findings agree on
+    # it without rendering them.
+    if isinstance(a, Ref):
+        return (a.name, a.kind)
+    if isinstance(a, RefList):
+        return tuple(argument_key(r) for r in a.refs)
+    if isinstance(a, Message):
+        return a.render(False)
+    return a
+
+
+class FindingGroup(object):
+    # Findings with the same level, rule and root cause.  Only the first few
+    # are kept, but which of their message's arguments differ (the
+    # positions in 'args' and the names in 'kwargs') and whether they were
+    # found in different places is noted for all of them.
+    __slots__ = ["key", "count", "sample", "args", "kwargs", "places"]
+
+    def __init__(self, key):
+        self.key = key
+        self.count = 0
+        self.sample = []
+        self.args = set()
+        self.kwargs = set()
+        self.places = False
+
+    def add(self, e):
+        self.count += 1
+        if not self.sample:
+            self.sample.append(e)
+            return
+        first = self.sample[0]
+        if e.location is not first.location or e.leaf != first.leaf:
+            self.places = True
+        if isinstance(e.message, Message) and isinstance(first.message, Message):
+            for i, (a, b) in enumerate(zip(e.message.args, first.message.args)):
+                if i not in self.args and argument_key(a) != argument_key(b):
+                    self.args.add(i)
+            for k, v in (e.message.kwargs or {}).items():
+                if k not in self.kwargs and argument_key(v) != argument_key((first.message.kwargs or {}).get(k)):
+                    self.kwargs.add(k)
+
+    def location(self):
+        # The deepest path all the samples are under.
+        nodes = [e.location for e in self.sample]
+        if not all(isinstance(n, PathNode) for n in nodes):
+            return nodes[0]
+        common = nodes[0].names()
+        for n in nodes[1:]:
+            names = n.names()
+            i = 0
+            while i < min(len(common), len(names)) and common[i] == names[i]:
+                i += 1
+            common = common[:i]
+        node = nodes[0]
+        for i in range(len(node.names()) - len(common)):
+            node = node.parent
+        return node
+
+    def details(self):
+        # (message, [details of each sample]): the message with the
+        # arguments that differ between the findings left out, and those
+        # arguments (and where it was, if that differs) for each sample.
+        first = self.sample[0]
+        details = [[] for e in self.sample]
+        message = first.message
+
+        if isinstance(message, Message) and (self.args or self.kwargs):
+            args = [u"..." if i in self.args else a for i, a in enumerate(message.args)]
+            kwargs = dict((k, u"..." if k in self.kwargs else v) for k, v in (message.kwargs or {}).items())
+            for d, e in zip(details, self.sample):
+                d.extend(e.message.args[i] for i in sorted(self.args))
+                d.extend(e.message.kwargs[k] for k in sorted(self.kwargs))
+            message = Message(message.template, args, kwargs)
+
+        if self.places:
+            for d, e in zip(details, self.sample):
+                d.append(u"at " + e.path)
+        return message, details
+
+    def summary(self):
+        first = self.sample[0]
+        location = self.location()
+        message, details = self.details()
+        samples = [Message(u", ".join([u"{}"] * len(d)), d) for d in details if d]
+        more = u"; ..." if self.count > len(self.sample) else u""
+        if samples:
+            message = Message(u"{} ({} times: " + u"; ".join([u"{}"] * len(samples)) + more + u")", [message, self.count] + samples)
+        else:
+            message = Message(u"{} ({} times)", (message, self.count))
+        level, rule, cause, template = self.key
+
+        key = u"{}: {} -- {} {} {}".format(level, location.string if isinstance(location, PathNode) else location, rule, cause, template)
+        key = re.sub("[^:].*/", "", key)
+        fingerprint = "{:08X}".format(abs(binascii.crc32(key.encode("utf-8"))))
+
+        return Error(location, message, level,
+                     index=first.index, context=first.context, inexcusable=first.inexcusable, rule=rule,
+                     count=self.count, fingerprint=fingerprint)
+
+
+class PathNode(object):
+    # One level of the nesting findings are recorded under.  Nodes are
+    # interned, so all the findings under a prefix share it, and the
+    # ':'-joined string is only built when someone asks for it.
+    __slots__ = ["parent", "name", "children", "_string"]
+
+    def __init__(self, parent=None, name=None):
+        self.parent = parent
+        self.name = name
+        self.children = None
+        self._string = None
+
+    def child(self, name):
+        if self.children is None:
+            self.children = {}
+        c = self.children.get(name)
+        if c is None:
+            c = self.children[name] = PathNode(self, name)
+        return c
+
+    def names(self):
+        r = []
+        n = self
+        while n.parent is not None:
+            r.append(n.name)
+            n = n.parent
+        return r[::-1]
+
+    @property
+    def string(self):
+        if self._string is None:
+            if self.parent is None:
+                self._string = u""
+            elif self.parent.parent is None:
+                self._string = u"{}".format(self.name)
+            else:
+                self._string = u"{}:{}".format(self.parent.string, self.name)
+        return self._string
+
+
 class NestedError(object):
     def __init__(self, ec, efp):
         self.ec = ec
@@ -533,9 +1253,85 @@ class NestedError(object):
 
 
 class ErrorCollector(object):
-    def __init__(self):
+    def __init__(self, fail_fast=False, max_findings=None, baseline=None, sinks=None, keep=True, aggregate=None):
         self.errors=[]
-        self.path=[]
+        self.node=PathNode()
+        self.rule=None
+
+        # Findings go to each sink as soon as they're final.  With
+        # keep=False they aren't retained after that, so memory doesn't grow
+        # with the number of findings.  'counts' has the findings per level.
+        self.sinks = list(sinks or [])
+        self.keep = keep
+        self.counts = dict(Error=0, Warning=0, Info=0)
+        self.recorded = 0
+        self.holds = 0
+
+        # With aggregate=N, errors and warnings are grouped by level, rule
+        # and root cause (the cause= they were recorded with, or else their
+        # message template) until the rule finishes.  Groups of more than N
+        # become one summary finding that lists the first N locations.
+        self.aggregate = aggregate
+        self.groups = collections.OrderedDict()
+        self.journal = []
+
+        # Cooperative cancellation.  Checkers poll 'cancelled' between rules
+        # (and between items in long loops) and stop scheduling work once
+        # it's set.  Findings in the baseline are dropped as they arrive.
+        self.baseline = set(baseline or [])
+        self.fail_fast = fail_fast
+        self.max_findings = max_findings
+        self.findings = 0
+        self.cancelled = False
+        self.cancel_reason = None
+
+    def child(self):
+        # A collector for a worker that continues where this one is.  The
+        # parent passes the worker's findings on to its sinks when it merges
+        # them.
+        c = ErrorCollector(fail_fast=self.fail_fast, max_findings=self.max_findings, baseline=self.baseline, aggregate=self.aggregate)
+        c.node = self.node
+        c.rule = self.rule
+        c.findings = self.findings
+        return c
+
+    def mark(self):
+        # Hold findings back from the sinks until the matching commit() or
+        # rollback().
+        self.holds += 1
+        return (len(self.errors), self.recorded, dict(self.counts), self.findings, self.cancelled, self.cancel_reason, len(self.journal))
+
+    def commit(self, mark):
+        self.holds -= 1
+        if not self.holds:
+            count = mark[0]
+            for e in self.errors[count:]:
+                self.emit(e)
+            if not self.keep:
+                del self.errors[count:]
+            del self.journal[:]
+
+    def rollback(self, mark):
+        # Forget everything recorded since mark().
+        self.holds -= 1
+        count, self.recorded, self.counts, self.findings, self.cancelled, self.cancel_reason, grouped = mark
+        del self.errors[count:]
+
+        for key in reversed(self.journal[grouped:]):
+            g = self.groups.get(key)
+            if g is None:
+                continue
+            g.count -= 1
+            if len(g.sample) > g.count:
+                g.sample.pop()
+            if not g.count:
+                del self.groups[key]
+        del self.journal[grouped:]
+
+    def cancel(self, reason):
+        if not self.cancelled:
+            self.cancelled = True
+            self.cancel_reason = reason
 
     def load_json(self, json):
         for i in json:
@@ -544,43 +1340,117 @@ class ErrorCollector(object):
     def dump_json(self):
         return map(lambda x:x._asdict(), self.errors)
 
+    def merge(self, dumped):
+        # Workers have already aggregated their findings.
+        for d in dumped:
+            self.store(Error(**d))
+
+    @property
+    def path(self):
+        return self.node.names()
+
     def push_path(self, path):
-        self.path.append(path)
+        self.node = self.node.child(path)
     def pop_path(self):
-        self.path = self.path[:-1]
+        if self.node.parent is not None:
+            self.node = self.node.parent
 
+    def add(self, e, cause=None):
+        if not self.aggregate or e.level == "Info":
+            self.store(e)
+            return
 
-    def record(self, efp, error, context="", level=None, inexcusable=False):
+        if hasattr(cause, "get_name"):
+            cause = (cause.__class__.__name__, cause.get_name())
+        template = e.message.template if isinstance(e.message, Message) else e.message
+        key = (e.level, e.rule, cause, template)
+
+        g = self.groups.get(key)
+        if g is None:
+            g = self.groups[key] = FindingGroup(key)
+        g.add(e)
+        if len(g.sample) < self.aggregate and e is not g.sample[0]:
+            g.sample.append(e)
+        if self.holds:
+            self.journal.append(key)
+
+    def flush(self):
+        # Pass on the groups aggregated so far.
+        groups = self.groups
+        self.groups = collections.OrderedDict()
+        for g in groups.values():
+            if g.count <= self.aggregate:
+                for e in g.sample:
+                    self.store(e)
+            else:
+                self.store(g.summary())
+
+    def store(self, e):
+        if self.baseline and e.hash() in self.baseline:
+            return
+        if self.max_findings is not None and self.findings >= self.max_findings:
+            return
+
+        e.index = self.recorded
+        self.recorded += 1
+        self.counts[e.level] = self.counts.get(e.level, 0) + 1
+        if self.keep or self.holds:
+            self.errors.append(e)
+        if not self.holds:
+            self.emit(e)
+
+        if (self.fail_fast or self.max_findings is not None) and e.level != "Info":
+            self.findings += 1
+            if self.fail_fast and e.level == "Error":
+                self.cancel("found an error")
+            if self.max_findings is not None and self.findings >= self.max_findings:
+                self.cancel("reached {} findings".format(self.max_findings))
+
+    def emit(self, e):
+        for s in self.sinks:
+            s.write(e)
+
+    def close(self):
+        self.flush()
+        for s in self.sinks:
+            s.close()
+
+    def record(self, efp, error, context="", level=None, inexcusable=False, cause=None):
         if not level:
             level = "Error"
 
         if hasattr(efp, "get_name"):
-            self.errors.append(Error(u"{}:{}".format(u":".join(self.path), efp.get_name()), error, level=level, index=len(self.errors), context=context, inexcusable=inexcusable))
+            leaf = efp.get_name()
         elif isinstance(efp, str):
-            self.errors.append(Error(u"{}:{}".format(u":".join(self.path), efp), error, level=level, index=len(self.errors), context=context, inexcusable=inexcusable))
+            leaf = efp
         else:
-            self.errors.append(Error(u":".join(self.path), error, level, index=len(self.errors), context=context, inexcusable=inexcusable))
+            leaf = None
+
+        self.add(Error(self.node, error, level, index=self.recorded, context=context, inexcusable=inexcusable, rule=self.rule, leaf=leaf), cause)
 
-    def record_error(self, efp,error, note="", inexcusable=False):
+    def record_error(self, efp,error, note="", inexcusable=False, cause=None):
         return self.record(efp,
                            error,
                            note,
                            None,
-                           inexcusable=inexcusable)
+                           inexcusable=inexcusable,
+                           cause=cause)
 
-    def record_warning(self, efp,error, note="", inexcusable=False):
+    def record_warning(self, efp,error, note="", inexcusable=False, cause=None):
 
         return self.record(efp,
                            error,
                            note,
                            "Warning",
-                           inexcusable=inexcusable)
+                           inexcusable=inexcusable,
+                           cause=cause)
 
-    def record_info(self, efp,error, note=""):
+    def record_info(self, efp,error, note="", cause=None):
         return self.record(efp,
                            error,
                            note,
-                           "Info")
+                           "Info",
+                           cause=cause)
 
     def get_errors(self):
         return self.errors
@@ -0,0 +1,159 @@
+import collections
+import hashlib
+import logging as log
+import os
+import time
+
+from inputs import MappedFile, LibraryCache
+from parallel import fork_imap
+
+# Linting whole trees of designs.  A tree is split into projects (each
+# schematic with the board of the same name, and each library on its own),
+# which are checked in forked workers, biggest first.  Libraries are parsed
+# once, before the workers start, so every worker shares them and every
+# design is checked against all of them.
+
+
+class Project(object):
+    # Files that are checked together.
+
+    __slots__ = ["name", "files", "size"]
+
+    def __init__(self, name, files):
+        self.name = name
+        self.files = sorted(files)
+        self.size = sum(os.path.getsize(f) for f in self.files)
+
+
+def content_hash(filename):
+    with MappedFile(filename) as f:
+        return hashlib.sha1(f.read()).hexdigest()
+
+
+def discover(root):
+    # Returns (designs, libraries, duplicates): a Project for each
+    # schematic/board pair, the paths of the libraries, and (path, original)
+    # for each library that's a copy of one we already have.  Hidden
+    # directories (.git and the like) are skipped.
+    designs = {}
+    libraries = []
+    duplicates = []
+    seen = {}
+    for d, dirs, files in os.walk(root):
+        dirs[:] = sorted(x for x in dirs if not x.startswith("."))
+        for f in sorted(files):
+            path = os.path.join(d, f)
+            base, ext = os.path.splitext(path)
+            if ext in (".sch", ".brd"):
+                designs.setdefault(base, []).append(path)
+            elif ext == ".lbr":
+                h = content_hash(path)
+                if h in seen:
+                    duplicates.append((path, seen[h]))
+                else:
+                    seen[h] = path
+                    libraries.append(path)
+
+    return [Project(base, files) for base, files in sorted(designs.items())], libraries, duplicates
+
+
+def megabytes(size):
+    return "{:.1f}MB".format(size / 1e6)
+
+
+def schedule(projects):
+    # Biggest first, so no worker is left with a big one at the end.
+    return sorted(projects, key=lambda p: -p.size)
+
+
+def load_libraries(libraries, options=None):
+    # Parse the libraries once, before any workers are forked, and return
+    # options that check designs against all of them.
+    from catalog import LibraryCatalog
+
+    options = dict(options or {})
+    cache = LibraryCache()
+    cache.preload(libraries)
+    catalog = options.get("catalog")
+    if catalog is None:
+        catalog = LibraryCatalog()
+    catalog.add(cache.load(l) for l in libraries)
+    catalog.index()
+    options.update(libraries=cache, catalog=catalog)
+    return options
+
+
+def lint_project(project, lints, errors, options, **kwargs):
+    # Run run_eaglelint_check (with the rest of its arguments in kwargs) on
+    # one project.  Returns its findings, dumped, how long it took, and (if
+    # options asks for them) its analysis stats, dumped.
+    from eaglelint import run_eaglelint_check
+    from SwoopChecker import AnalysisStats, dump_stats
+
+    start = time.time()
+    child = errors.child()
+    stats = collections.defaultdict(AnalysisStats)
+    try:
+        # Each project gets its own fix plan.
+        run_eaglelint_check(dict.fromkeys(project.files), lints, errors=child,
+                            options=dict(options, jobs=1, fixes=None,
+                                         analysis_stats=stats if options.get("analysis_stats") is not None else None),
+                            **kwargs)
+    except Exception as e:
+        # A design that won't parse (or trips up a checker) is reported,
+        # and the rest of the tree still gets checked.
+        with child.nest(project.name):
+            child.record_error(None, u"Couldn't check: {}".format(e))
+    child.flush()
+    return child.dump_json(), time.time() - start, dump_stats(stats)
+
+
+def lint_projects(projects, lints, errors, jobs=1, options=None, progress=None, **kwargs):
+    # Lint each project in up to jobs workers.  Each project's findings go
+    # to errors as soon as it's done, and a line about it to progress.
+    from SwoopChecker import merge_stats
+
+    options = options or {}
+    order = schedule(projects)
+
+    def run(project):
+        return lint_project(project, lints, errors, options, **kwargs)
+
+    start = time.time()
+    done = checked = 0
+    results = fork_imap(run, order, jobs)
+    try:
+        for i, (dumped, seconds, built) in results:
+            if options.get("analysis_stats") is not None:
+                merge_stats(options["analysis_stats"], built)
+            if errors.cancelled:
+                break
+            errors.merge(dumped)
+            errors.flush()
+            done += 1
+            checked += order[i].size
+            if progress:
+                progress.write("eaglelint: [{}/{}] {} ({}) in {:.1f}s\n".format(done, len(order), order[i].name, megabytes(order[i].size), seconds))
+    finally:
+        results.close()
+
+    if progress:
+        elapsed = max(time.time() - start, 1e-6)
+        progress.write("eaglelint: checked {} projects ({}) in {:.1f}s, {}/s\n".format(
+            done, megabytes(checked), elapsed, megabytes(checked / elapsed)))
+    return errors
+
+
+def find_projects(root):
+    # (projects, libraries) under root: the designs, and each library as a
+    # project of its own.
+    designs, libraries, duplicates = discover(root)
+    for path, original in duplicates:
+        log.info("skipping {}: it's the same as {}".format(path, original))
+    return designs + [Project(l, [l]) for l in libraries], libraries
+
+
+def check_tree(root, lints, errors, jobs=1, options=None, progress=None, **kwargs):
+    projects, libraries = find_projects(root)
+    options = load_libraries(libraries, options)
+    return lint_projects(projects, lints, errors, jobs=jobs, options=options, progress=progress, **kwargs)
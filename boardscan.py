@@ -0,0 +1,119 @@
+from lxml import etree
+
+# A one-pass reader for the few things about a board that the streamable
+# BoardLint rules look at: vias, pours, what's in the Dimension layer, and
+# the geometry of displayed attributes.  It reads the file with iterparse and
+# throws each XML element away once it's been seen, so memory use depends on
+# how many of those things there are rather than on the size of the board.
+#
+# run_eaglelint_check uses it instead of parsing the board into Swoop objects
+# when every enabled rule that looks at boards is streamable (see
+# Checker.needs_board_tree).  Values are parsed the way Swoop parses them and
+# kept in the same order, so the rules find the same things either way.  The
+# board's libraries are kept by name, so the LibraryLint pass over them
+# reports examining them just as it does on a parsed board.
+
+
+def _float(s):
+    return None if s is None else float(s)
+
+
+def _int(s):
+    return None if s is None else int(s)
+
+
+class ScannedLibrary(object):
+    # Just the name of one of the board's libraries, which is all LibraryLint
+    # looks at when its rules are disabled.
+
+    def __init__(self, name):
+        self.name = name
+
+    def get_name(self):
+        return self.name
+
+
+class BoardScan(object):
+
+    def __init__(self, stream, filename):
+        self.filename = filename
+        self.layers = {}            # number -> name
+        self.libraries = {}         # name -> ScannedLibrary
+        self.signals = {}           # name -> ([(x, y, drill)], [isolate])
+        self.elements = {}          # name -> {attribute name: (display, size, ratio, font)}
+        self.dimension_widths = []  # widths of the wires in 'Dimension'
+        self.dimension_others = 0   # anything else in 'Dimension' but holes and circles
+        self._scan(stream)
+
+    def get_filename(self):
+        return self.filename
+
+    def get_libraries(self):
+        return list(self.libraries.values())
+
+    def _scan(self, stream):
+        # Swoop keeps libraries, signals, elements and attributes in dicts
+        # keyed by name, so we do too: filled in the same order, they
+        # iterate in the same order.
+        tags = []
+        signal = element = None
+        for event, e in etree.iterparse(stream, events=("start", "end"), huge_tree=True):
+            if event == "end":
+                tags.pop()
+                e.clear()
+                while e.getprevious() is not None:
+                    del e.getparent()[0]
+                continue
+
+            parent = tags[-1] if tags else None
+            tags.append(e.tag)
+
+            if parent == "layers" and e.tag == "layer":
+                self.layers[int(e.get("number"))] = e.get("name")
+            elif parent == "libraries" and e.tag == "library":
+                self.libraries[e.get("name")] = ScannedLibrary(e.get("name"))
+            elif parent == "signals" and e.tag == "signal":
+                signal = self.signals[e.get("name")] = ([], [])
+            elif parent == "signal" and e.tag == "via":
+                signal[0].append((float(e.get("x")), float(e.get("y")), float(e.get("drill"))))
+            elif parent == "signal" and e.tag == "polygon":
+                signal[1].append(_float(e.get("isolate")))
+            elif parent == "elements" and e.tag == "element":
+                element = self.elements[e.get("name")] = {}
+            elif parent == "element" and e.tag == "attribute":
+                element[e.get("name")] = (e.get("display") != "off",
+                                          _float(e.get("size")),
+                                          _int(e.get("ratio")),
+                                          e.get("font"))
+            elif parent == "plain" and e.get("layer") is not None:
+                if self.layers.get(int(e.get("layer"))) != "Dimension":
+                    continue
+                if e.tag == "wire":
+                    self.dimension_widths.append(float(e.get("width")))
+                elif e.tag not in ("hole", "circle"):
+                    self.dimension_others += 1
+
+    def vias(self):
+        # (signal, x, y, drill) for every via.
+        for name, (vias, pours) in self.signals.items():
+            for x, y, drill in vias:
+                yield name, x, y, drill
+
+    def pours(self):
+        # (signal, isolate) for every polygon in a signal.
+        for name, (vias, pours) in self.signals.items():
+            for isolate in pours:
+                yield name, isolate
+
+    def dimension(self):
+        # (widths of the wires in 'Dimension', number of other things in it)
+        return self.dimension_widths, self.dimension_others
+
+    def displayed_attributes(self, attribute):
+        # (element, size, ratio, font) for each element's displayed
+        # attribute with this name.
+        for name, attributes in self.elements.items():
+            if attribute in attributes:
+                display, size, ratio, font = attributes[attribute]
+                if display:
+                    yield name, size, ratio, font
@@ -0,0 +1,164 @@
+import binascii
+import json
+import os
+
+from lxml import etree
+
+# An index of the libraries a run can resolve parts against: for each
+# library, its symbols, packages and devicesets (with their devices and
+# technologies) by name, and a fingerprint of each item's contents.  It's
+# built once per run from the libraries given, and can be saved and loaded
+# again, so a shop's whole library set doesn't have to be parsed to check
+# which parts come from it.
+#
+# Library names are matched without regard to case, like Eagle does.
+
+KINDS = ["symbols", "packages", "devicesets"]
+INDEX_VERSION = 1
+
+
+def fingerprint(item):
+    return "%08X" % (binascii.crc32(etree.tostring(item.get_et())) & 0xffffffff)
+
+
+def file_stamp(filename):
+    # (size, mtime) of a library file, or None if it isn't a file on disk
+    # (e.g. it came out of a zip).
+    try:
+        s = os.stat(filename)
+    except (OSError, TypeError):
+        return None
+    return [s.st_size, s.st_mtime]
+
+
+class CatalogEntry(object):
+    # One library.  Items map names to fingerprints, which are worked out
+    # when first needed if we have the parsed library.
+
+    __slots__ = ["name", "filename", "stamp", "library", "items", "devices"]
+
+    def __init__(self, name, filename=None, stamp=None, library=None):
+        self.name = name
+        self.filename = filename
+        self.stamp = stamp
+        self.library = library
+        self.items = dict((k, {}) for k in KINDS)
+        self.devices = {}   # deviceset -> {device: [technology, ...]}
+
+    @classmethod
+    def from_library(cls, library, filename=None):
+        e = cls(library.get_name(), filename, file_stamp(filename), library)
+        for s in library.get_symbols():
+            e.items["symbols"][s.get_name()] = None
+        for p in library.get_packages():
+            e.items["packages"][p.get_name()] = None
+        for ds in library.get_devicesets():
+            e.items["devicesets"][ds.get_name()] = None
+            e.devices[ds.get_name()] = dict((d.get_name(), [t.get_name() for t in d.get_technologies()])
+                                            for d in ds.get_devices())
+        return e
+
+    def fingerprint(self, kind, name):
+        fp = self.items[kind].get(name)
+        if fp is None and name in self.items[kind] and self.library is not None:
+            get = getattr(self.library, "get_" + kind[:-1])
+            fp = self.items[kind][name] = fingerprint(get(name))
+        return fp
+
+    def to_json(self):
+        for kind in KINDS:
+            for name in self.items[kind]:
+                self.fingerprint(kind, name)
+        return dict(name=self.name, file=self.filename, stamp=self.stamp,
+                    items=self.items, devices=self.devices)
+
+    @classmethod
+    def from_json(cls, d):
+        e = cls(d["name"], d["file"], d["stamp"])
+        e.items = d["items"]
+        e.devices = d["devices"]
+        return e
+
+
+class LibraryCatalog(object):
+
+    def __init__(self, lbrs=()):
+        self.entries = {}   # upper case library name -> CatalogEntry
+        self.pending = []   # (library, filename) not indexed yet
+        self.changed = False
+        self.add(lbrs)
+
+    def add(self, lbrs):
+        # lbrs are LibraryFiles or Libraries.  They're indexed when the
+        # catalog is first used, and a library with the same name as one
+        # already in the catalog replaces it.
+        for l in lbrs:
+            if hasattr(l, "get_library"):
+                self.pending.append((l.get_library(), l.get_filename()))
+            else:
+                self.pending.append((l, None))
+
+    def index(self):
+        pending = self.pending
+        self.pending = []
+        for library, filename in pending:
+            key = library.get_name().upper()
+            old = self.entries.get(key)
+            if old is not None and old.library is library:
+                continue
+            if old is not None and old.library is None and old.filename == filename and old.stamp is not None and old.stamp == file_stamp(filename):
+                # Loaded from an index, and the file hasn't changed since.
+                old.library = library
+                continue
+            self.entries[key] = CatalogEntry.from_library(library, filename)
+            self.changed = True
+
+    def library(self, name):
+        if self.pending:
+            self.index()
+        return self.entries.get(name.upper())
+
+    def _has(self, kind, library, name):
+        e = self.library(library)
+        return e is not None and name in e.items[kind]
+
+    def has_symbol(self, library, name):
+        return self._has("symbols", library, name)
+
+    def has_package(self, library, name):
+        return self._has("packages", library, name)
+
+    def has_deviceset(self, library, name):
+        return self._has("devicesets", library, name)
+
+    def technologies(self, library, deviceset, device):
+        # The technologies of a device, or None if the library doesn't have it.
+        e = self.library(library)
+        if e is None:
+            return None
+        return e.devices.get(deviceset, {}).get(device)
+
+    def fingerprint(self, kind, library, name):
+        e = self.library(library)
+        return None if e is None else e.fingerprint(kind, name)
+
+    def save(self, filename):
+        if self.pending:
+            self.index()
+        with open(filename, "w") as f:
+            json.dump(dict(version=INDEX_VERSION,
+                           libraries=[e.to_json() for k, e in sorted(self.entries.items())]),
+                      f, indent=1, sort_keys=True)
+        self.changed = False
+
+    @classmethod
+    def load(cls, filename):
+        catalog = cls()
+        with open(filename) as f:
+            index = json.load(f)
+        if index.get("version") != INDEX_VERSION:
+            raise ValueError("{} is not a version {} library index".format(filename, INDEX_VERSION))
+        for d in index["libraries"]:
+            e = CatalogEntry.from_json(d)
+            catalog.entries[e.name.upper()] = e
+        return catalog
@@ -0,0 +1,143 @@
+import binascii
+import collections
+import json
+import os
+import subprocess
+
+from lxml import etree
+
+# Linting only what changed since a git revision.  Each design is compared
+# with its version at the revision (from 'git show') object by object:
+# parts, nets, elements, signals, library items and so on, each identified
+# by kind and name and compared by a CRC of its XML.  A part that changed
+# also touches the nets it's on, and an element the signals it's on.
+#
+# Rules say which kinds of objects their findings depend on (@rule's
+# 'covers').  Only rules that cover a kind that changed are run; the findings
+# of the others are carried over from the previous run's results.  Rules that
+# don't say what they cover always run.
+
+ITEM_KINDS = ("symbols", "packages", "devicesets")
+NAMED_KINDS = ("parts", "elements", "signals")
+
+
+def old_version(filename, rev):
+    # The contents of filename at rev, or None if it wasn't there.
+    directory, name = os.path.split(os.path.abspath(filename))
+    try:
+        with open(os.devnull, "w") as devnull:
+            return subprocess.check_output(["git", "show", "{}:./{}".format(rev, name)], cwd=directory, stderr=devnull)
+    except (subprocess.CalledProcessError, OSError):
+        return None
+
+
+def object_fingerprints(data):
+    # ({(kind, name): crc}, {(kind, name): set of (kind, name) it touches})
+    # for a design.  Anything we don't know how to split up is one object
+    # of kind 'other'.
+    fps = {}
+    touches = collections.defaultdict(set)
+
+    def add(key, e):
+        fps[key] = binascii.crc32(etree.tostring(e), fps.get(key, 0))
+
+    def add_items(library, group):
+        for item in group:
+            add((group.tag, u"{}/{}".format(library, item.get("name"))), item)
+
+    root = etree.fromstring(data)
+    for doc in root.find("drawing"):
+        if doc.tag not in ("schematic", "board", "library"):
+            add(("other", doc.tag), doc)
+            continue
+
+        for section in doc:
+            if section.tag == "libraries":
+                for library in section:
+                    for group in library:
+                        if group.tag in ITEM_KINDS:
+                            add_items(library.get("name"), group)
+                        else:
+                            add(("other", u"{}/{}".format(library.get("name"), group.tag)), group)
+            elif section.tag in ITEM_KINDS:
+                add_items(doc.get("name"), section)
+            elif section.tag in NAMED_KINDS:
+                for item in section:
+                    add((section.tag, item.get("name")), item)
+                    for c in item.iter("contactref"):
+                        touches[("elements", c.get("element"))].add((section.tag, item.get("name")))
+            elif section.tag == "plain":
+                add(("plain", u""), section)
+            elif section.tag == "sheets":
+                for i, sheet in enumerate(section):
+                    for part in sheet:
+                        if part.tag == "instances":
+                            for instance in part:
+                                add(("parts", instance.get("part")), instance)
+                        elif part.tag in ("nets", "busses"):
+                            for net in part:
+                                add(("nets", net.get("name")), net)
+                                for r in net.iter("pinref"):
+                                    touches[("parts", r.get("part"))].add(("nets", net.get("name")))
+                        elif part.tag == "plain":
+                            add(("plain", u"sheet {}".format(i + 1)), part)
+                        else:
+                            add(("other", u"sheet {}/{}".format(i + 1, part.tag)), part)
+            else:
+                add(("other", section.tag), section)
+
+    return fps, touches
+
+
+def changed_objects(filename, rev):
+    # The set of (kind, name) that differ between filename and its version
+    # at rev, including the objects the changed ones touch, or None if it's
+    # a new file.
+    old = old_version(filename, rev)
+    if old is None:
+        return None
+    with open(filename, "rb") as f:
+        new_fps, new_touches = object_fingerprints(f.read())
+    old_fps, old_touches = object_fingerprints(old)
+
+    changed = set(k for k in set(new_fps) | set(old_fps) if new_fps.get(k) != old_fps.get(k))
+    for k in list(changed):
+        changed |= new_touches.get(k, set()) | old_touches.get(k, set())
+    return changed
+
+
+def rules_to_skip(rules, kinds):
+    # IDs of the rules whose findings can't have changed if only objects of
+    # these kinds did.
+    return sorted(r.rule_id for r in rules if getattr(r, "rule_covers", None) and not kinds & set(r.rule_covers))
+
+
+def changed_kinds(filenames, rev):
+    # (kinds, summary): the kinds of objects that changed in any of the
+    # files (None for everything) and a count of them by kind.
+    kinds = set()
+    summary = collections.Counter()
+    for filename in filenames:
+        if not filename.endswith((".sch", ".brd", ".lbr")):
+            return None, summary
+        changed = changed_objects(filename, rev)
+        if changed is None:
+            return None, summary
+        for kind, name in changed:
+            kinds.add(kind)
+            summary[kind] += 1
+    if "other" in kinds:
+        return None, summary
+    return kinds, summary
+
+
+def load_findings(filename):
+    # Findings saved with --format jsonl.
+    findings = []
+    with open(filename) as f:
+        for l in f:
+            if l.strip():
+                d = json.loads(l)
+                d.pop("hash", None)
+                findings.append(dict((str(k), v) for k, v in d.items()))
+    return findings
@@ -0,0 +1,287 @@
+import bisect
+
+import Swoop
+
+from SwoopChecker import transform_point, analysis
+
+# Geometric connectivity for schematics.  Each sheet gets a union-find over
+# the points where things can connect (wire endpoints, junctions and pin
+# locations) so we can compare what the drawing looks like with what the
+# netlist says in near-linear time.
+
+
+def point_key(x, y):
+    return (round(x, 4), round(y, 4))
+
+
+class UnionFind(object):
+
+    def __init__(self):
+        self.parent = {}
+        self.size = {}
+
+    def add(self, x):
+        if x not in self.parent:
+            self.parent[x] = x
+            self.size[x] = 1
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return a
+        if self.size[a] < self.size[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.size[a] += self.size[b]
+        return a
+
+    def groups(self):
+        r = {}
+        for x in self.parent:
+            r.setdefault(self.find(x), []).append(x)
+        return r
+
+
+class WireIndex(object):
+    # Finds the wires that pass through a point.  Axis-aligned wires are
+    # bucketed by their constant coordinate and sorted along it, so a lookup
+    # only looks at the wires near the point in one row and one column.
+    # Other wires only connect at their ends.
+
+    def __init__(self):
+        self.endpoints = {}
+        self.horizontal = {}
+        self.vertical = {}
+        self.sorted = None
+
+    def add(self, x1, y1, x2, y2, owner):
+        a = point_key(x1, y1)
+        b = point_key(x2, y2)
+        self.endpoints.setdefault(a, []).append(owner)
+        self.endpoints.setdefault(b, []).append(owner)
+        if a[1] == b[1]:
+            self.horizontal.setdefault(a[1], []).append((min(a[0], b[0]), max(a[0], b[0]), owner))
+        elif a[0] == b[0]:
+            self.vertical.setdefault(a[0], []).append((min(a[1], b[1]), max(a[1], b[1]), owner))
+        self.sorted = None
+
+    def _sort(self, buckets):
+        # Each bucket becomes (los, spans, reach) where reach[i] is the
+        # furthest any of the first i + 1 spans extends.
+        r = {}
+        for k, spans in buckets.items():
+            spans = sorted(spans, key=lambda s: s[0])
+            reach = []
+            furthest = float("-inf")
+            for lo, hi, owner in spans:
+                furthest = max(furthest, hi)
+                reach.append(furthest)
+            r[k] = ([lo for lo, hi, owner in spans], spans, reach)
+        return r
+
+    def _stab(self, bucket, v, r):
+        if bucket is None:
+            return
+        los, spans, reach = bucket
+        i = bisect.bisect_left(los, v) - 1
+        while i >= 0 and reach[i] > v:
+            if spans[i][1] > v:
+                r.append(spans[i][2])
+            i -= 1
+
+    def query(self, point):
+        if self.sorted is None:
+            self.sorted = (self._sort(self.horizontal), self._sort(self.vertical))
+        horizontal, vertical = self.sorted
+        x, y = point
+        r = list(self.endpoints.get(point, []))
+        self._stab(horizontal.get(y), x, r)
+        self._stab(vertical.get(x), y, r)
+        return r
+
+
+class Fragment(object):
+
+    def __init__(self, net, points, pins):
+        self.net = net
+        self.points = sorted(points)
+        self.pins = pins
+
+    def get_location(self):
+        return self.points[0]
+
+
+class SheetConnectivity(object):
+
+    def __init__(self, sheet, layer="Nets"):
+        self.sheet = sheet
+        self.uf = UnionFind()
+        self.wires = WireIndex()
+
+        self.net_names = []
+        self.net_points = {}    # net name -> wire endpoints
+        self.net_pins = {}      # net name -> set of (part, gate, pin)
+        self.segments = []      # (net, segment)
+        self.segment_pins = []  # segment index -> set of (part, gate, pin)
+        self.pins = {}          # (part, gate, pin) -> location
+
+        self._add_pins()
+        self._add_nets(layer)
+
+    def _add_pins(self):
+        for i in self.sheet.get_instances():
+            part = i.find_part()
+            if part is None or part.find_deviceset() is None:
+                continue
+            gate = part.find_deviceset().get_gate(i.get_gate())
+            symbol = gate.find_symbol() if gate is not None else None
+            if symbol is None:
+                continue
+
+            mirrored = i.get_mirrored()
+            rotation = i.get_rotation()
+            for p in symbol.get_pins():
+                x, y = transform_point(p.get_x(), p.get_y(), i.get_x(), i.get_y(), rotation, mirrored)
+                self.pins[(i.get_part(), i.get_gate(), p.get_name())] = point_key(x, y)
+
+    def _add_nets(self, layer):
+        for n in self.sheet.get_nets():
+            name = n.get_name()
+            if name not in self.net_points:
+                self.net_names.append(name)
+                self.net_points[name] = set()
+                self.net_pins[name] = set()
+
+            for s in n.get_segments():
+                index = len(self.segments)
+                self.segments.append((n, s))
+
+                for w in s.get_wires():
+                    if w.get_layer() != layer:
+                        continue
+                    x1, y1, x2, y2 = w.get_points()
+                    a = point_key(x1, y1)
+                    b = point_key(x2, y2)
+                    self.net_points[name].add((x1, y1))
+                    self.net_points[name].add((x2, y2))
+                    self.uf.add((index, a))
+                    self.uf.add((index, b))
+                    self.uf.union((index, a), (index, b))
+                    self.wires.add(x1, y1, x2, y2, (index, a))
+
+                for j in s.get_junctions():
+                    self.uf.add((index, point_key(j.get_x(), j.get_y())))
+
+                pins = set()
+                for r in s.get_pinrefs():
+                    pin = (r.get_part(), r.get_gate(), r.get_pin())
+                    pins.add(pin)
+                    if pin in self.pins:
+                        self.uf.add((index, self.pins[pin]))
+                self.segment_pins.append(pins)
+                self.net_pins[name] |= pins
+
+        # Ends of wires, junctions and pins that land on a wire of the same
+        # segment are connected to it, even in the middle of the wire.
+        for node in list(self.uf.parent):
+            index, point = node
+            for owner in self.wires.query(point):
+                if owner[0] == index:
+                    self.uf.union(node, owner)
+
+    def phantom_connections(self):
+        # Pairs of distinct nets that share a wire endpoint without being
+        # connected: [(name, name, points), ...] in net order.
+        point_nets = {}
+        for name in self.net_names:
+            for p in self.net_points[name]:
+                point_nets.setdefault(p, []).append(name)
+
+        order = dict((n, i) for i, n in enumerate(self.net_names))
+        pairs = set()
+        for names in point_nets.values():
+            for a in names:
+                for b in names:
+                    if order[a] < order[b]:
+                        pairs.add((order[a], order[b]))
+
+        r = []
+        for a, b in sorted(pairs):
+            n1 = self.net_names[a]
+            n2 = self.net_names[b]
+            r.append((n1, n2, self.net_points[n1].intersection(self.net_points[n2])))
+        return r
+
+    def fragments(self):
+        # Pieces of a segment that aren't geometrically connected to the rest
+        # of it.  The piece with the most pins is taken to be the segment
+        # itself; segments of a net with pins elsewhere that connect no pins
+        # at all are dangling islands.
+        nodes_by_segment = {}
+        for node in self.uf.parent:
+            nodes_by_segment.setdefault(node[0], []).append(node)
+
+        r = []
+        for index, (net, segment) in enumerate(self.segments):
+            groups = {}
+            for node in nodes_by_segment.get(index, []):
+                groups.setdefault(self.uf.find(node), []).append(node[1])
+
+            pieces = []
+            for points in groups.values():
+                points = set(points)
+                pins = [p for p in self.segment_pins[index] if self.pins.get(p) in points]
+                pieces.append(Fragment(net, points, pins))
+            pieces.sort(key=lambda f: (-len(f.pins), -len(f.points), f.get_location()))
+
+            if not pieces:
+                continue
+            if pieces[0].pins or not self.net_pins[net.get_name()]:
+                pieces = pieces[1:]
+            r += pieces
+        return r
+
+    def touching_pins(self):
+        # Pins that sit on a wire of a net they aren't part of:
+        # [(pin, net), ...] where pin is (part, gate, pin).
+        r = []
+        for pin in sorted(self.pins):
+            nets = set()
+            for index, end in self.wires.query(self.pins[pin]):
+                if pin not in self.segment_pins[index]:
+                    nets.add(self.segments[index][0].get_name())
+            for name in sorted(nets):
+                if pin not in self.net_pins[name]:
+                    r.append((pin, name))
+        return r
+
+
+class SchematicConnectivity(object):
+
+    def __init__(self, sch, layer="Nets"):
+        self.sheets = [SheetConnectivity(s, layer) for s in Swoop.From(sch).get_sheets()]
+
+    def pin_counts(self):
+        # Number of pins on each net across every sheet, in net order.
+        names = []
+        pins = {}
+        for s in self.sheets:
+            for n in s.net_names:
+                if n not in pins:
+                    names.append(n)
+                    pins[n] = set()
+                pins[n] |= s.net_pins[n]
+        return [(n, len(pins[n])) for n in names]
+
+
+@analysis("connectivity")
+def schematic_connectivity(ctx, sch):
+    return SchematicConnectivity(sch)
@@ -1,40 +1,31 @@
+import collections
+import os
 import re
-import Swoop
 import copy
-import SwoopChecker
-from SwoopChecker import ErrorCollector, CheckSet
-from LibraryStyle import LibraryLint
-from BoardStyle import BoardLint
-from SchematicStyle import SchematicLint
+import json
 import zipfile
-import importlib
 import StringIO
 import logging as log
 
+import registry
+import sinks
+from inputs import MappedFile
+
+# Checkers and Swoop are imported lazily, so '--help' and runs that only use
+# some of the checkers don't pay for loading the rest.
+
 
 def lint_lbr(errors, lbr, fix=False):
+    from LibraryStyle import LibraryLint
     LibraryLint(errors=errors, lbrs=[lbr.get_library()], fix=fix).check()
 
 class UnimplementedException(Exception):
     pass;
 
-GenericChecks = CheckSet([
-    LibraryLint, BoardLint, SchematicLint
-])
-
 def get_checker(checker):
-    try:
-        return eval(checker)
-    except:
-        try:
-            head = checker.split(".")[:-1]
-            if not head:
-                return eval(checker)
-            tail = checker.split(".")[-1]
-            m = importlib.import_module(".".join(head))
-            return getattr(m,tail)
-        except Exception as e:
-            raise Exception("Couldn't load checker '{}': {}".format(checker, e))
+    if not isinstance(checker, basestring):
+        return checker
+    return registry.get_checker(checker)
 
 def run_eaglelint_check(files,
                lints,
@@ -43,24 +34,106 @@ def run_eaglelint_check(files,
                write=None,
                ext=None,
                filter=False,
-               options=None
+               options=None,
+               dry_run=False
                ):
+    import Swoop
+    from SwoopChecker import ErrorCollector, CheckerContext
+
+    from fixes import FixPlan
+    from catalog import LibraryCatalog
+
     if options is None:
         options = {}
 
+    # Fixers add to this plan, which is applied once all the checks are done
+    # (or, with dry_run, left for the caller to save).
+    fixes = options.get("fixes")
+    if fixes is None:
+        fixes = FixPlan()
+        options = dict(options, fixes=fixes)
+
     if not errors:
         errors = ErrorCollector()
 
+    approved_errors = []
+    if filter:
+        for filename in files:
+            try:
+                with open(filename + ".err", "r") as f:
+                    log.info("loading errors from {}".format(filename + ".err"))
+                    for l in f.readlines():
+                        l = l.strip()
+                        m = re.search("(^|\(|:)([0-9A-F]{8})\)?$", l)
+                        if m and m.group(2):
+                            approved_errors.append(m.group(2))
+            except IOError:
+                pass
+
+    # Findings that are already approved are dropped as they're recorded, so
+    # they never reach the output or count towards --fail-fast or
+    # --max-findings.
+    errors.baseline.update(approved_errors)
+
+    # Resolve each checker once per run.
+    checkers = [(registry.lookup(l) if isinstance(l, basestring) else None, l) for l in lints]
+
+    # Analyses of the designs (connectivity and the like) are shared by all
+    # the checkers in the run.
+    context = CheckerContext()
+
+    def run_checkers(sch=None, brd=None):
+        for r, checker in checkers:
+            if errors.cancelled:
+                return
+            if r is not None:
+                if not r.applies(sch=sch, brd=brd, lbrs=lbrs):
+                    continue
+                checker = r.load()
+            checker(sch=sch, errors=errors, context=context, brd=brd, lbrs=lbrs.values(), fix=fix, options=options).check()
+
+    def needs_board_tree(checker):
+        if isinstance(checker, basestring):
+            return registry.needs_board_tree(checker, options)
+        return not hasattr(checker, "needs_board_tree") or checker.needs_board_tree(options)
+
+    # Boards are only parsed into Swoop objects if an enabled rule needs
+    # that.  If the streamable rules are all that's enabled, they run on a
+    # one-pass scan of the file instead.  That's decided when the first
+    # board is loaded, so runs without boards don't import the board
+    # checkers to find out.
+    board_tree = []
+
+    def scan_boards():
+        if not board_tree:
+            board_tree.append(fix or any(needs_board_tree(l) for l in lints))
+        return not board_tree[0]
+
     schs = {}
     lbrs = {}
     brds = {}
 
+    # Libraries parsed by earlier runs (see inputs.LibraryCache).
+    libraries = None if fix else options.get("libraries")
+
     def collect_files(file_list, strict=True):
         for (filename, stream) in file_list.items():
+            if stream is None:
+                # Files given by name are opened just while they're parsed.
+                if filename[-3:] == "lbr" and libraries is not None:
+                    lbrs[filename] = libraries.load(filename)
+                else:
+                    with MappedFile(filename) as stream:
+                        collect_files({filename: stream}, strict)
+                continue
+
             log.info("opening {}".format(filename))
             if filename[-3:] == "sch":
                 sch = Swoop.SchematicFile.from_stream(Swoop.SchematicFile, stream, filename=filename)
                 schs[filename] = sch
+            elif filename[-3:] == "brd" and scan_boards():
+                from boardscan import BoardScan
+                brds[filename] = BoardScan(stream, filename)
             elif filename[-3:] == "brd":
                 brd = Swoop.BoardFile.from_stream(Swoop.BoardFile, stream, filename=filename)
                 brds[filename] = brd
@@ -85,19 +158,13 @@ def run_eaglelint_check(files,
 
     collect_files(file_list=files)
 
-    approved_errors = []
-    if filter:
-        for filename in files:
-            try:
-                with open(filename + ".err", "r") as f:
-                    print("loading errors from {}".format(filename + ".err"))
-                    for l in f.readlines():
-                        l = l.strip()
-                        m = re.search("(^|\(|:)([0-9A-F]{8})\)?$", l)
-                        if m and m.group(2):
-                            approved_errors.append(m.group(2))
-            except IOError:
-                pass
+    # Every checker in the run resolves parts against one catalog of the
+    # libraries, which may also have been loaded from a saved index.
+    catalog = options.get("catalog")
+    if catalog is None:
+        catalog = LibraryCatalog()
+        options = dict(options, catalog=catalog)
+    catalog.add(lbrs.values())
 
     brds_tmp = copy.deepcopy(brds)
 
@@ -107,22 +174,45 @@ def run_eaglelint_check(files,
         brd = brds.get(brd_name)
         if brd_name in brds_tmp:
             del brds_tmp[brd_name]
-        for l in lints:
-            get_checker(l)(sch=sch, errors=errors, brd=brd, lbrs=lbrs.values(), fix=fix, options=options).check()
+        run_checkers(sch=sch, brd=brd)
 
     # Run unpained .brd files along with all the libraries
     for brd in brds_tmp.values():
-        for l in lints:
-            get_checker(l)(brd=brd, errors=errors, lbrs=lbrs.values(), fix=fix).check()
+        run_checkers(brd=brd)
 
     # If there are no .sch and no .brd, run the libraries on their own.
     if len(schs) == 0 and len(brds) == 0:
-        for l in lints:
-            get_checker(l)(errors=errors, lbrs=lbrs.values(), fix=fix).check()
+        run_checkers()
 
     if fix:
+        documents = schs.values() + brds.values() + lbrs.values()
+        fixes.bind(dict((f.get_filename(), f) for f in documents))
+
+        if dry_run:
+            for f in documents:
+                planned = fixes.planned(f)
+                if planned:
+                    with errors.nest(f.get_filename()):
+                        errors.record_info(None, u"Would apply {} fixes: {}".format(sum(c for e, c in planned),
+                                                                                    ", ".join(u"{} {}".format(c, e) for e, c in planned)))
+        else:
+            fixes.apply()
+
+        for filename, edit, reason in fixes.conflicts:
+            with errors.nest(filename):
+                errors.record_warning(None, u"Couldn't apply fix ({}): {}".format(edit, reason))
+
+        for f in documents:
+            # Report what was fixed in each file, and only write the files
+            # that changed.
+            summary = fixes.summary(f)
+            if not summary:
+                continue
+
+            with errors.nest(f.get_filename()):
+                errors.record_info(None, u"Applied {} fixes: {}".format(sum(c for e, c in summary),
+                                                                        ", ".join(u"{} {}".format(c, e) for e, c in summary)))
 
-        for f in schs.values() + brds.values()+ lbrs.values():
             if not ext:
                 n = ""
             else:
@@ -134,7 +224,11 @@ def run_eaglelint_check(files,
             if write:
                 f.write(name)
 
-    errors.filter_by_hash(approved_errors)
+    stats = options.get("analysis_stats")
+    if stats is not None:
+        for name, s in context.stats.items():
+            stats[name].add(s)
+
     return errors
 
 def main():
@@ -145,41 +239,189 @@ def main():
     parser.add_argument("--fix", action="store_true", help="Repair simple errors in a kludgy way")
     parser.add_argument("--no-filter", dest="filter", default=True, action="store_false", help="Don't filter errors")
     parser.add_argument("--write", action="store_true", help="Write out repaired files")
+    parser.add_argument("--fix-plan", metavar="FILE", help="With --fix, save the fixes to FILE for review instead of applying them")
+    parser.add_argument("--apply-plan", metavar="FILE", help="Apply fixes saved with --fix-plan without running the checks")
     parser.add_argument("--suffix", help="Write to foo-<suffix>.<ext> instead of foo.<ext>")
     parser.add_argument("--check", nargs="*", default=["GenericChecks"], help="Checkers to run")
     parser.add_argument("--strict", action="store_true", help="Warnings are errors")
     parser.add_argument("--quiet", action="store_true", help="Supress non-errors")
     parser.add_argument("--html", action="store_true", help="output html intsead of txt")
+    parser.add_argument("--format", choices=sorted(sinks.formats), default="text", help="Output format")
+    parser.add_argument("--output", help="Write findings to this file instead of stdout")
     parser.add_argument("--files", nargs="+", help="Files to lint")
+    parser.add_argument("--recursive", metavar="DIR", help="Lint every schematic, board and library under DIR")
+    parser.add_argument("--queue", metavar="QUEUE", help="Work queue (a shared directory, or 'scheme:location') for linting across machines: with --recursive, publish the projects to it")
+    parser.add_argument("--work", action="store_true", help="Lint projects from --queue until they've all been done")
+    parser.add_argument("--merge", action="store_true", help="Report the findings from --queue")
+    parser.add_argument("--lease", type=float, default=600, metavar="SECONDS", help="How long a worker may hold a project from --queue before it's given to another")
     parser.add_argument("--force", action="store_true", help="Force success regardless of errors.")
+    parser.add_argument("--jobs", type=int, default=1, help="Run independent checks on a design in this many worker processes")
+    parser.add_argument("--enable", nargs="+", metavar="RULE", help="Only run these rules (IDs or patterns like 'sch-*')")
+    parser.add_argument("--disable", nargs="+", metavar="RULE", help="Don't run these rules (IDs or patterns like 'brd-*')")
+    parser.add_argument("--fail-fast", action="store_true", help="Stop at the first error that isn't in the baseline")
+    parser.add_argument("--max-findings", type=int, metavar="N", help="Stop after N errors and warnings that aren't in the baseline")
+    parser.add_argument("--rule-budget", type=float, metavar="SECONDS", help="Skip any rule that runs longer than this")
+    parser.add_argument("--file-budget", type=float, metavar="SECONDS", help="Skip the remaining rules on a design after this long")
+    parser.add_argument("--aggregate", type=int, nargs="?", const=5, metavar="N", help="Summarize each kind of problem found more than N times (default 5) as one finding")
+    parser.add_argument("--library-index", metavar="FILE", help="Also look for parts' libraries in this index, and add the libraries given with --files to it")
+    parser.add_argument("--since", metavar="REV", help="Only run the rules that cover objects that changed since this git revision")
+    parser.add_argument("--previous", metavar="FILE", help="With --since, findings (saved with --format jsonl) to carry over for the rules that aren't run")
+    parser.add_argument("--analysis-stats", action="store_true", help="Report how often each shared analysis was built and reused, and how long building took")
+    parser.add_argument("--list-rules", action="store_true", help="List the rules the selected checkers provide and exit")
     args = parser.parse_args()
 
-    if not args.html:
+    if args.queue and not (args.recursive or args.work or args.merge):
+        parser.error("--queue needs --recursive (to publish), --work or --merge")
+    if (args.work or args.merge) and not args.queue:
+        parser.error("--work and --merge need --queue")
+    if args.queue and (args.fix or args.fix_plan or args.apply_plan):
+        parser.error("--queue can't be used with --fix")
+    if not args.list_rules and not args.files and not args.recursive and not args.queue:
+        parser.error("give the files to lint with --files or --recursive")
+    if args.recursive and (args.files or args.fix_plan or args.apply_plan):
+        parser.error("--recursive can't be used with --files, --fix-plan or --apply-plan")
+    if args.since and not (args.files and args.previous):
+        parser.error("--since needs --files and --previous")
+    if args.since and (args.fix or args.fix_plan or args.apply_plan):
+        parser.error("--since can't be used with --fix")
+
+    if args.list_rules:
+        for name in args.check:
+            for r in registry.list_rules(name):
+                print(u"{:20} {}".format(r.rule_id, r.rule_description))
+        sys.exit(0)
+
+    import SwoopChecker
+    if not args.html or args.format != "text":
         SwoopChecker.html_output = False
 
-    files = {f: open(f, "r") for f in args.files}
+    from fixes import FixPlan
+    lints = args.check
+    fix = args.fix or bool(args.fix_plan)
+    if args.apply_plan:
+        with open(args.apply_plan) as f:
+            fixes = FixPlan.from_json(json.load(f))
+        lints = []
+        fix = True
+    else:
+        fixes = FixPlan()
+
+    if args.queue:
+        import workqueue
+        queue = workqueue.open_queue(args.queue, lease=args.lease)
+        if args.recursive:
+            try:
+                items = workqueue.publish(queue, args.recursive, lints,
+                                          options=dict(enable=args.enable,
+                                                       disable=args.disable,
+                                                       rule_budget=args.rule_budget,
+                                                       file_budget=args.file_budget),
+                                          filter=args.filter,
+                                          aggregate=args.aggregate,
+                                          html=SwoopChecker.html_output)
+            except ValueError as e:
+                sys.stderr.write("eaglelint: {}\n".format(e))
+                sys.exit(2)
+            sys.stderr.write("eaglelint: published {} projects to {}\n".format(len(items), args.queue))
+            sys.exit(0)
+        elif args.work:
+            checked = workqueue.work(queue, progress=None if args.quiet else sys.stderr)
+            sys.stderr.write("eaglelint: checked {} projects\n".format(checked))
+            sys.exit(0)
+
+    from catalog import LibraryCatalog
+    if args.library_index and os.path.exists(args.library_index):
+        catalog = LibraryCatalog.load(args.library_index)
+    else:
+        catalog = LibraryCatalog()
+
+    # Findings are written as they're found rather than collected first.
+    output = open(args.output, "w") if args.output else sys.stdout
+    sink = sinks.make_sink(args.format, output, quiet=args.quiet)
+
+    check = dict(lints=lints,
+                 errors=SwoopChecker.ErrorCollector(fail_fast=args.fail_fast,
+                                                    max_findings=args.max_findings,
+                                                    sinks=[sink],
+                                                    aggregate=args.aggregate,
+                                                    keep=False),
+                 fix=fix,
+                 write=args.write,
+                 ext=args.suffix,
+                 filter=args.filter,
+                 options=dict(jobs=args.jobs,
+                              enable=args.enable,
+                              disable=args.disable,
+                              rule_budget=args.rule_budget,
+                              file_budget=args.file_budget,
+                              fixes=fixes,
+                              catalog=catalog))
+    if args.analysis_stats:
+        check["options"]["analysis_stats"] = collections.defaultdict(SwoopChecker.AnalysisStats)
+
+    carried = []
+    if args.since:
+        # Rules that don't cover anything that changed are skipped, and
+        # their findings from last time are reported again.
+        import changes
+        kinds, changed = changes.changed_kinds(args.files, args.since)
+        if kinds is None:
+            skipped = []
+        else:
+            skipped = changes.rules_to_skip(sum([registry.list_rules(l) for l in lints], []), kinds)
+        selected = dict(enable=args.enable, disable=args.disable)
+        check["options"]["disable"] = (args.disable or []) + skipped
+        check["options"]["unchanged_rules"] = [r for r in skipped if SwoopChecker.rule_selected(r, selected)]
+        carried = [d for d in changes.load_findings(args.previous)
+                   if d["rule"] in skipped and SwoopChecker.rule_selected(d["rule"], selected)]
+        sys.stderr.write("eaglelint: changed since {}: {}; skipping {} rules, carrying over {} findings\n".format(
+            args.since,
+            "everything" if kinds is None else ", ".join("{} {}".format(n, k) for k, n in sorted(changed.items())) or "nothing",
+            len(skipped), len(carried)))
+
+    if args.merge:
+        errors = workqueue.merge(queue, check["errors"])
+    elif args.recursive:
+        # Each project is checked on its own, and --jobs spreads the
+        # projects over workers.
+        import batch
+        errors = batch.check_tree(args.recursive, jobs=args.jobs,
+                                  progress=None if args.quiet else sys.stderr, **check)
+    else:
+        # Files are opened lazily, one at a time.
+        errors = run_eaglelint_check(dict.fromkeys(args.files), dry_run=bool(args.fix_plan), **check)
+        if carried and not errors.cancelled:
+            errors.merge(carried)
+            errors.flush()
+
+    if args.fix_plan:
+        with open(args.fix_plan, "w") as f:
+            json.dump(fixes.to_json(), f, indent=1, sort_keys=True)
+
+    if args.library_index:
+        catalog.index()
+        if catalog.changed:
+            catalog.save(args.library_index)
+
+    errors.close()
+    if args.output:
+        output.close()
 
-    errors = run_eaglelint_check(files,
-                        lints=args.check,
-                        fix=args.fix,
-                        write=args.write,
-                        ext=args.suffix,
-                        filter=args.filter)
+    if args.analysis_stats:
+        for name, s in sorted(check["options"]["analysis_stats"].items()):
+            sys.stderr.write("eaglelint: analysis {}: built {} times in {:.2f}s, reused {} times\n".format(name, s.builds, s.seconds, s.hits))
 
-    if not args.quiet:
-        for e in filter(lambda x: x.level == "Info", errors.get_errors()):
-            print(e)
-    for e in filter(lambda x: x.level != "Info", errors.get_errors()):
-        print(u"{}".format(e))
+    if errors.cancelled:
+        sys.stderr.write("eaglelint: stopped early: {}\n".format(errors.cancel_reason))
 
     if args.strict:
-        if len(filter(lambda x: x.level != "Info", errors.get_errors())):
+        if errors.counts["Error"] + errors.counts["Warning"]:
             sys.exit(1)
         else:
             sys.exit(0)
 
     else:
-        if len(filter(lambda x: x.level == "Error", errors.get_errors())) and not args.force:
+        if errors.counts["Error"] and not args.force:
             sys.exit(1)
         else:
             sys.exit(0)
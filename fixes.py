@@ -0,0 +1,200 @@
+import collections
+
+import Swoop
+
+import queries
+
+# Fixers don't change designs directly.  They add typed edits to a FixPlan:
+# set an attribute of an object from its old value to a new one, or add a
+# new child to an object.  The plan is applied in one batch once all the
+# checks have run, so every rule sees the design as it was loaded.  It can
+# also be saved as JSON for review and applied later without running the
+# checks again.  Applying a plan notes which files changed, so --write only
+# rewrites those.
+
+
+def _items(items):
+    if isinstance(items, Swoop.From):
+        return items.unpack()
+    elif isinstance(items, (list, tuple)):
+        return items
+    return [items]
+
+
+def locate(obj):
+    # (file, path) where path is [[class name, child index], ...] from the
+    # file down to obj.
+    path = []
+    while obj.get_parent() is not None:
+        parent = obj.get_parent()
+        index = next(i for i, c in enumerate(parent.get_children()) if c is obj)
+        path.append([type(obj).__name__, index])
+        obj = parent
+    return obj, path[::-1]
+
+
+def resolve(f, path):
+    obj = f
+    for cls, index in path:
+        children = obj.get_children()
+        if index >= len(children) or type(children[index]).__name__ != cls:
+            raise ValueError("no {} at {}".format(cls, path))
+        obj = children[index]
+    return obj
+
+
+def _native(v):
+    # JSON gives us unicode, but Swoop's setters want str.
+    if isinstance(v, unicode):
+        return v.encode("utf-8")
+    elif isinstance(v, list):
+        return [_native(i) for i in v]
+    elif isinstance(v, dict):
+        return dict((_native(k), _native(i)) for k, i in v.items())
+    return v
+
+
+class Edit(object):
+    # op is "set" (attr goes from old to new) or "add" (a new child of kind
+    # attr, built as new = (class name, {attribute: value})).
+    __slots__ = ["target", "op", "attr", "old", "new"]
+
+    def __init__(self, target, op, attr, old, new):
+        self.target = target
+        self.op = op
+        self.attr = attr
+        self.old = old
+        self.new = new
+
+    def describe(self):
+        return u"{} {}".format(self.op, self.attr)
+
+    def build(self):
+        cls, values = self.new
+        child = getattr(Swoop, cls)()
+        for attr, value in sorted(values.items()):
+            getattr(child, "set_" + attr)(value)
+        return child
+
+    def exists(self):
+        # Whether target already has a child just like the one we'd add.
+        cls, values = self.new
+        for c in self.target.get_children():
+            if type(c).__name__ == cls and all(getattr(c, "get_" + a)() == v for a, v in values.items()):
+                return True
+        return False
+
+    def apply(self, check_old=False):
+        # With check_old, an edit to a value that has changed since the plan
+        # was made raises ValueError, and adds that were already made are
+        # skipped.  Returns whether the design changed.
+        if self.op == "set":
+            current = getattr(self.target, "get_" + self.attr)()
+            if current == self.new:
+                return False
+            if check_old and current != self.old:
+                raise ValueError(u"{} is {}, not {}".format(self.attr, current, self.old))
+            getattr(self.target, "set_" + self.attr)(self.new)
+        else:
+            if check_old and self.exists():
+                return False
+            getattr(self.target, "add_" + self.attr)(self.build())
+        return True
+
+
+class FixPlan(object):
+
+    def __init__(self):
+        self.edits = collections.OrderedDict()
+        self.unbound = []   # (filename, path, op, attr, old, new) from from_json()
+        self.applied = collections.OrderedDict()  # id(file) -> (file, Counter of edits)
+        self.conflicts = []  # (file, edit description, reason)
+        self.verify = False  # Check old values (for saved plans)
+
+    def set(self, items, **values):
+        # e.g. fixes.set(wire, x1=0, y1=0).  Setting an attribute to the
+        # value it already has isn't an edit, and a later edit to the same
+        # attribute replaces an earlier one.
+        for obj in _items(items):
+            for attr, value in sorted(values.items()):
+                key = (id(obj), attr)
+                if key in self.edits:
+                    self.edits[key].new = value
+                elif getattr(obj, "get_" + attr)() != value:
+                    self.edits[key] = Edit(obj, "set", attr, getattr(obj, "get_" + attr)(), value)
+
+    def add(self, parent, kind, cls, **values):
+        # e.g. fixes.add(package, "drawing_element", "Wire", layer="tKeepout", ...)
+        key = (id(parent), kind, cls, tuple(sorted(values.items())))
+        if key not in self.edits:
+            self.edits[key] = Edit(parent, "add", kind, None, (cls, values))
+
+    def __len__(self):
+        return len(self.edits) + len(self.unbound)
+
+    def planned(self, f):
+        # [(edit, count), ...] for the edits planned for file f.
+        counts = collections.Counter()
+        for e in self.edits.values():
+            if e.target.get_file() is f:
+                counts[e.describe()] += 1
+        return sorted(counts.items())
+
+    def bind(self, files):
+        # Resolve edits loaded from a saved plan against the designs they
+        # were made for.  files maps file names to Swoop files.
+        for filename, path, op, attr, old, new in self.unbound:
+            f = files.get(filename)
+            try:
+                if f is None:
+                    raise ValueError("not loaded")
+                target = resolve(f, path)
+            except ValueError as e:
+                self.conflicts.append((filename, u"{} {}".format(op, attr), str(e)))
+                continue
+            edit = Edit(target, op, attr, old, tuple(new) if op == "add" else new)
+            self.edits[(id(target), attr, len(self.edits))] = edit
+        self.unbound = []
+
+    def apply(self):
+        edits = self.edits
+        self.edits = collections.OrderedDict()
+        for e in edits.values():
+            try:
+                changed = e.apply(self.verify)
+            except ValueError as x:
+                self.conflicts.append((e.target.get_file().get_filename(), e.describe(), str(x)))
+                continue
+            if changed:
+                f = e.target.get_file()
+                if id(f) not in self.applied:
+                    self.applied[id(f)] = (f, collections.Counter())
+                self.applied[id(f)][1][e.describe()] += 1
+        for f, counts in self.applied.values():
+            queries.invalidate(f)
+
+    def is_dirty(self, f):
+        return id(f) in self.applied
+
+    def summary(self, f):
+        # [(edit, count), ...] for the edits applied to f.
+        if not self.is_dirty(f):
+            return []
+        return sorted(self.applied[id(f)][1].items())
+
+    def to_json(self):
+        r = []
+        for e in self.edits.values():
+            f, path = locate(e.target)
+            r.append(dict(file=f.get_filename(), path=path, op=e.op, attr=e.attr, old=e.old, new=e.new))
+        for filename, path, op, attr, old, new in self.unbound:
+            r.append(dict(file=filename, path=path, op=op, attr=attr, old=old, new=new))
+        return dict(version=1, edits=r)
+
+    @classmethod
+    def from_json(cls, json):
+        plan = cls()
+        plan.verify = True
+        for e in _native(json["edits"]):
+            plan.unbound.append((e["file"], e["path"], e["op"], e["attr"], e["old"], e["new"]))
+        return plan
@@ -0,0 +1,75 @@
+import mmap
+import os
+
+# Design files are opened when they're parsed rather than all up front, read
+# through a read-only memory map, and closed again as soon as they've been
+# parsed.  Mapping lets the OS share the pages between processes linting the
+# same files and drop them under memory pressure.
+
+
+class MappedFile(object):
+    # A read-only file-like view of a memory-mapped file.  Python 2's mmap
+    # needs a size for read() and isn't a context manager, so this fills in.
+
+    def __init__(self, filename):
+        self.name = filename
+        with open(filename, "rb") as f:
+            # Empty files can't be mapped.
+            if os.fstat(f.fileno()).st_size:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self.map = None
+
+    def read(self, size=-1):
+        if self.map is None:
+            return ""
+        if size is None or size < 0:
+            size = self.map.size() - self.map.tell()
+        return self.map.read(size)
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if self.map is not None:
+            self.map.seek(offset, whence)
+
+    def tell(self):
+        return 0 if self.map is None else self.map.tell()
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class LibraryCache(object):
+    # Standalone libraries, parsed once and reused by every run in the
+    # process that names the same file.  A batch driver loads the shared
+    # libraries into one of these before it forks its workers, so they all
+    # see one parsed copy, copy-on-write, instead of each parsing their own.
+    # Fixes change libraries, so fix runs don't use it.
+
+    def __init__(self):
+        self.libraries = {}
+
+    def key(self, filename):
+        # A file that's changed on disk is parsed again.
+        s = os.stat(filename)
+        return (filename, s.st_size, s.st_mtime)
+
+    def load(self, filename):
+        import Swoop
+        key = self.key(filename)
+        if key not in self.libraries:
+            with MappedFile(filename) as stream:
+                self.libraries[key] = Swoop.LibraryFile.from_stream(Swoop.LibraryFile, stream, filename=filename)
+        return self.libraries[key]
+
+    def preload(self, filenames):
+        for filename in filenames:
+            if filename.endswith(".lbr"):
+                self.load(filename)
@@ -0,0 +1,68 @@
+import multiprocessing
+import os
+
+# Run work in forked worker processes.  The workers are forked after the
+# function and its inputs are stashed in module globals, so they see the
+# parent's parsed designs copy-on-write and only the results (which must be
+# picklable) travel back.  Results come back in the order of the inputs.
+
+_fork_function = None
+_fork_items = None
+
+
+def _fork_call(i):
+    return _fork_function(_fork_items[i])
+
+
+def can_fork():
+    return hasattr(os, "fork")
+
+
+def fork_map(function, items, jobs):
+    global _fork_function, _fork_items
+
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1 or not can_fork() or _fork_function is not None:
+        # Nested calls (from inside a worker) run serially.
+        return [function(i) for i in items]
+
+    _fork_function = function
+    _fork_items = items
+    pool = multiprocessing.Pool(processes=min(jobs, len(items)))
+    try:
+        return pool.map(_fork_call, range(len(items)), chunksize=1)
+    finally:
+        pool.close()
+        pool.join()
+        _fork_function = None
+        _fork_items = None
+
+
+def _fork_indexed(i):
+    return i, _fork_function(_fork_items[i])
+
+
+def fork_imap(function, items, jobs):
+    # Like fork_map, but yields (index, result) pairs as the workers finish
+    # them.  Items are handed out one at a time in order, so putting the
+    # biggest first keeps every worker busy until the end.
+    global _fork_function, _fork_items
+
+    items = list(items)
+    if jobs <= 1 or len(items) <= 1 or not can_fork() or _fork_function is not None:
+        for i, item in enumerate(items):
+            yield i, function(item)
+        return
+
+    _fork_function = function
+    _fork_items = items
+    pool = multiprocessing.Pool(processes=min(jobs, len(items)))
+    try:
+        for r in pool.imap_unordered(_fork_indexed, range(len(items)), chunksize=1):
+            yield r
+    finally:
+        # Also stops the workers if the caller gives up early.
+        pool.terminate()
+        pool.join()
+        _fork_function = None
+        _fork_items = None
@@ -0,0 +1,88 @@
+import collections
+import weakref
+
+import Swoop
+
+# The checkers walk the same collections of a design over and over: every
+# net's segments, every pinref, every element.  Each Swoop.From chain builds
+# its lists from scratch, so DocumentQueries remembers them per document,
+# along with lookup tables built from them.  Checkers get one from
+# Checker.queries(), shared by the checkers that share a CheckerContext.
+#
+# Fixes don't change designs while the checks run (they go into a FixPlan),
+# but when a plan is applied, FixPlan calls invalidate() on every document it
+# changed and their queries start over.
+
+_live = weakref.WeakSet()
+_part_keys = weakref.WeakKeyDictionary()
+
+
+def invalidate(doc):
+    for q in list(_live):
+        if q.doc is doc:
+            q.clear()
+    _part_keys.clear()
+
+
+def part_keys(part):
+    # (deviceset + device, upper-cased value or None) for a part, which
+    # pattern matching compares over and over.
+    try:
+        return _part_keys[part]
+    except KeyError:
+        value = part.get_value()
+        keys = _part_keys[part] = (part.get_deviceset() + part.get_device(), value.upper() if value else None)
+        return keys
+
+
+class DocumentQueries(object):
+
+    def __init__(self, doc):
+        self.doc = doc
+        self.cache = {}
+        _live.add(self)
+
+    def clear(self):
+        self.cache.clear()
+
+    def memo(self, key, build):
+        # build() the first time key is asked for, and the same thing after.
+        try:
+            return self.cache[key]
+        except KeyError:
+            r = self.cache[key] = build()
+            return r
+
+    def _select(self, path):
+        if not path:
+            return [self.doc]
+        return self.memo(("select",) + path,
+                         lambda: getattr(Swoop.From(self._select(path[:-1])), "get_" + path[-1])().unpack())
+
+    def select(self, *path):
+        # Swoop.From(doc).get_<path[0]>().get_<path[1]>()..., e.g.
+        # select("sheets", "nets", "segments").  Each step along the way is
+        # remembered, so select("sheets", "nets") is free after that.
+        return Swoop.From(self._select(path))
+
+    def group_by(self, attr, *path):
+        # {value of get_<attr>(): [objects]} for the objects select(*path)
+        # finds, in the order it finds them.
+        def build():
+            groups = collections.defaultdict(list)
+            for x in self._select(path):
+                groups[getattr(x, "get_" + attr)()].append(x)
+            return dict(groups)
+        return self.memo(("group_by", attr) + path, build)
+
+    def names(self, *path):
+        # The set of names of the objects select(*path) finds.
+        return self.memo(("names",) + path, lambda: frozenset(x.get_name() for x in self._select(path)))
+
+    # The ones the built-in checkers use most.
+
+    def pinrefs(self):
+        return self.select("sheets", "nets", "segments", "pinrefs")
+
+    def pinrefs_by_part(self):
+        return self.group_by("part", "sheets", "nets", "segments", "pinrefs")
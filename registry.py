@@ -0,0 +1,133 @@
+import importlib
+
+# Maps checker names to where they live so we only import the modules for
+# the checkers a run actually uses.  Third-party checkers register under the
+# 'eaglelint.checkers' setuptools entry point group, e.g.
+#
+#   entry_points={'eaglelint.checkers': ['MyChecks = mypackage.checks:MyChecks']}
+#
+# 'needs' lists the inputs ('sch', 'brd', 'lbrs') a checker looks at.  A
+# checker is skipped, and never imported, when any of them is missing.
+
+ENTRY_POINT_GROUP = "eaglelint.checkers"
+
+
+class Registration(object):
+
+    def __init__(self, name, target, needs=None, members=None, entry_point=None):
+        self.name = name
+        self.target = target
+        self.needs = needs
+        self.members = members
+        self.entry_point = entry_point
+        self.checker = None
+
+    def applies(self, sch=None, brd=None, lbrs=None):
+        if self.members is not None:
+            return any(lookup(m).applies(sch, brd, lbrs) for m in self.members)
+        if self.needs is None:
+            return True
+        present = dict(sch=bool(sch), brd=bool(brd), lbrs=bool(lbrs))
+        return all(present[n] for n in self.needs)
+
+    def load(self):
+        if self.checker is None:
+            if self.members is not None:
+                self.checker = import_target("SwoopChecker:CheckSet")(list(self.members))
+            elif self.entry_point is not None:
+                self.checker = self.entry_point.load()
+            else:
+                self.checker = import_target(self.target)
+        return self.checker
+
+
+builtin_checkers = [
+    Registration("LibraryLint", "LibraryStyle:LibraryLint", needs=["lbrs"]),
+    Registration("BoardLint", "BoardStyle:BoardLint", needs=["brd"]),
+    Registration("SchematicLint", "SchematicStyle:SchematicLint", needs=["sch"]),
+    Registration("ConsistencyLint", "ConsistencyStyle:ConsistencyLint", needs=["sch", "brd"]),
+    Registration("NoopChecker", "SwoopChecker:NoopChecker"),
+    Registration("GenericChecks", None, members=["LibraryLint", "BoardLint", "SchematicLint", "ConsistencyLint"]),
+]
+
+registry = {r.name: r for r in builtin_checkers}
+_entry_points_loaded = False
+
+
+def import_module(module):
+    # Our own modules are imported relative to the EagleLint package when
+    # we're installed, and from the working directory when run in place.
+    package = __name__.rpartition(".")[0]
+    if package:
+        try:
+            return importlib.import_module("." + module, package)
+        except ImportError:
+            pass
+    return importlib.import_module(module)
+
+
+def import_target(target):
+    module, attr = target.split(":")
+    return getattr(import_module(module), attr)
+
+
+def _load_entry_points():
+    global _entry_points_loaded
+    if _entry_points_loaded:
+        return
+    _entry_points_loaded = True
+
+    try:
+        import pkg_resources
+    except ImportError:
+        return
+
+    for ep in pkg_resources.iter_entry_points(ENTRY_POINT_GROUP):
+        if ep.name not in registry:
+            registry[ep.name] = Registration(ep.name, None, entry_point=ep)
+
+
+def register(name, target, needs=None):
+    registry[name] = Registration(name, target, needs=needs)
+    return registry[name]
+
+
+def lookup(name):
+    if name not in registry:
+        _load_entry_points()
+
+    if name not in registry:
+        # Fall back to a dotted path to any importable checker class.
+        head, _, tail = name.rpartition(".")
+        if not head:
+            raise Exception("Couldn't load checker '{}': no such checker".format(name))
+        register(name, "{}:{}".format(head, tail))
+
+    return registry[name]
+
+
+def list_rules(name):
+    r = lookup(name)
+    if r.members is not None:
+        return sum([list_rules(m) for m in r.members], [])
+    checker = r.load()
+    return checker.get_rules() if hasattr(checker, "get_rules") else []
+
+
+def needs_board_tree(name, options):
+    # Checkers that don't look at boards don't need them parsed, and aren't
+    # imported to find out.
+    r = lookup(name)
+    if r.members is not None:
+        return any(needs_board_tree(m, options) for m in r.members)
+    if r.needs is not None and "brd" not in r.needs:
+        return False
+    checker = r.load()
+    return checker.needs_board_tree(options) if hasattr(checker, "needs_board_tree") else True
+
+
+def get_checker(name):
+    try:
+        return lookup(name).load()
+    except Exception as e:
+        raise Exception("Couldn't load checker '{}': {}".format(name, e))
@@ -0,0 +1,98 @@
+import json
+
+# Output sinks.  ErrorCollector hands each finding to its sinks as soon as
+# it's final, so output appears while the run is still going and nothing
+# has to hold on to the findings.  A sink sees each finding once, in the
+# order it was recorded.
+
+SARIF_SCHEMA = "https://json.schemastore.org/sarif-2.1.0.json"
+SARIF_LEVELS = {"Error": "error", "Warning": "warning", "Info": "note"}
+DESIGN_SUFFIXES = (".sch", ".brd", ".lbr")
+
+
+class Sink(object):
+
+    def __init__(self, stream, quiet=False):
+        self.stream = stream
+        self.quiet = quiet
+
+    def wants(self, error):
+        return not (self.quiet and error.level == "Info")
+
+    def write(self, error):
+        pass
+
+    def close(self):
+        self.stream.flush()
+
+
+class TextSink(Sink):
+
+    def write(self, error):
+        if self.wants(error):
+            self.stream.write(u"{}\n".format(error))
+
+
+class JSONLinesSink(Sink):
+    # One JSON object per finding, per line.
+
+    def write(self, error):
+        if self.wants(error):
+            d = error._asdict()
+            d["hash"] = error.hash()
+            self.stream.write(json.dumps(d, sort_keys=True) + "\n")
+            self.stream.flush()
+
+
+class SARIFSink(Sink):
+    # A SARIF 2.1.0 log with one run.  The results array is written as
+    # findings arrive and the document is closed by close().
+
+    def __init__(self, stream, quiet=False):
+        super(SARIFSink, self).__init__(stream, quiet)
+        self.results = 0
+        header = json.dumps({"$schema": SARIF_SCHEMA,
+                             "version": "2.1.0",
+                             "runs": [{"tool": {"driver": {"name": "EagleLint"}},
+                                       "results": []}]},
+                            sort_keys=True)
+        # Split the document just inside the (empty) results array.
+        i = header.index('"results": [') + len('"results": [')
+        self.stream.write(header[:i])
+        self.footer = header[i:]
+
+    def write(self, error):
+        if not self.wants(error):
+            return
+
+        location = {"logicalLocations": [{"fullyQualifiedName": error.path}]}
+        design = error.path.split(":")[0]
+        if design.endswith(DESIGN_SUFFIXES):
+            location["physicalLocation"] = {"artifactLocation": {"uri": design}}
+
+        result = {"level": SARIF_LEVELS.get(error.level, "none"),
+                  "message": {"text": error.error},
+                  "locations": [location],
+                  "partialFingerprints": {"eaglelint/v1": error.hash()}}
+        if error.rule:
+            result["ruleId"] = error.rule
+        if error.count > 1:
+            result["occurrenceCount"] = error.count
+
+        if self.results:
+            self.stream.write(",")
+        self.stream.write("\n" + json.dumps(result, sort_keys=True))
+        self.results += 1
+
+    def close(self):
+        self.stream.write("\n" + self.footer + "\n")
+        super(SARIFSink, self).close()
+
+
+formats = {"text": TextSink,
+           "jsonl": JSONLinesSink,
+           "sarif": SARIFSink}
+
+
+def make_sink(format, stream, quiet=False):
+    return formats[format](stream, quiet=quiet)
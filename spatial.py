@@ -0,0 +1,173 @@
+import math
+
+import Swoop
+
+from SwoopChecker import analysis, bounding_boxes, union_of_boxes, transform_box
+
+# A static R-tree over axis-aligned boxes (x1, y1, x2, y2), bulk loaded with
+# Sort-Tile-Recursive packing.  Build is O(n log n) and a query visits
+# O(log n + k) nodes, so finding all overlapping pairs in a set of n boxes
+# costs roughly O(n log n) instead of the O(n^2) pairwise scan.
+
+
+def boxes_overlap(a, b):
+    # Boxes that only touch along an edge or at a corner don't overlap.
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def boxes_intersect(a, b):
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def union_box(boxes):
+    x1 = y1 = float("inf")
+    x2 = y2 = float("-inf")
+    for b in boxes:
+        if b[0] < x1:
+            x1 = b[0]
+        if b[1] < y1:
+            y1 = b[1]
+        if b[2] > x2:
+            x2 = b[2]
+        if b[3] > y2:
+            y2 = b[3]
+    return x1, y1, x2, y2
+
+
+class RTreeNode(object):
+    __slots__ = ["box", "children", "leaf"]
+
+    def __init__(self, box, children, leaf):
+        self.box = box
+        self.children = children
+        self.leaf = leaf
+
+
+class RTree(object):
+
+    def __init__(self, entries, node_size=16):
+        # entries is a sequence of (box, payload) pairs.
+        self.node_size = node_size
+        self.size = 0
+        level = []
+        for box, payload in entries:
+            level.append((box, payload))
+            self.size += 1
+
+        if not level:
+            self.root = None
+            return
+
+        leaf = True
+        while True:
+            level = self._pack(level, leaf)
+            leaf = False
+            if len(level) == 1:
+                break
+        self.root = level[0][1]
+
+    def _pack(self, items, leaf):
+        center_x = lambda i: i[0][0] + i[0][2]
+        center_y = lambda i: i[0][1] + i[0][3]
+
+        n = len(items)
+        node_count = int(math.ceil(n / float(self.node_size)))
+        slice_count = int(math.ceil(math.sqrt(node_count)))
+        slice_size = slice_count * self.node_size
+
+        items = sorted(items, key=center_x)
+        nodes = []
+        for s in range(0, n, slice_size):
+            strip = sorted(items[s:s + slice_size], key=center_y)
+            for i in range(0, len(strip), self.node_size):
+                children = strip[i:i + self.node_size]
+                box = union_box([c[0] for c in children])
+                nodes.append((box, RTreeNode(box, children, leaf)))
+        return nodes
+
+    def __len__(self):
+        return self.size
+
+    def query(self, box):
+        # Yield (box, payload) for every entry whose box intersects box
+        # (touching counts).
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            for child_box, child in node.children:
+                if not boxes_intersect(box, child_box):
+                    continue
+                if node.leaf:
+                    yield child_box, child
+                else:
+                    stack.append(child)
+
+
+def overlapping_pairs(entries, node_size=16):
+    # Return [(payload_a, payload_b), ...] for every pair of entries whose
+    # boxes overlap, each pair once, in the order the entries were given.
+    entries = list(entries)
+    indexed = [(box, i) for i, (box, payload) in enumerate(entries)]
+    tree = RTree(indexed, node_size=node_size)
+
+    pairs = []
+    for i, (box, payload) in enumerate(entries):
+        hits = sorted(j for other_box, j in tree.query(box) if j > i and boxes_overlap(box, other_box))
+        for j in hits:
+            pairs.append((payload, entries[j][1]))
+    return pairs
+
+
+def package_courtyards(package):
+    # Returns (top, bottom) boxes in package coordinates.  Keepout
+    # drawings are the courtyard; packages without any fall back to the
+    # extent of their copper.  Either may be None.
+    elements = Swoop.From(package).get_drawing_elements().without_type(Swoop.Hole).without_type(Swoop.Text)
+    top = union_of_boxes(bounding_boxes(elements.with_layer("tKeepout")))
+    bottom = union_of_boxes(bounding_boxes(elements.with_layer("bKeepout")))
+
+    if top or bottom:
+        return top, bottom
+
+    copper = []
+    for pad in package.get_pads():
+        r = (pad.get_diameter() or pad.get_drill()) / 2
+        copper.append((pad.get_x() - r, pad.get_y() - r, pad.get_x() + r, pad.get_y() + r))
+    for smd in package.get_smds():
+        dx, dy = smd.get_dx() / 2, smd.get_dy() / 2
+        if smd.get_rotation() % 180 == 90:
+            dx, dy = dy, dx
+        copper.append((smd.get_x() - dx, smd.get_y() - dy, smd.get_x() + dx, smd.get_y() + dy))
+
+    if not copper:
+        return None, None
+    return union_box(copper), None
+
+
+@analysis("spatial")
+def element_courtyards(ctx, brd):
+    # {"top": [(box, element), ...], "bottom": [...]}: the courtyard of every
+    # element on each side of the board, in board coordinates.
+    courtyards = {}
+    sides = {"top": [], "bottom": []}
+
+    for e in ctx.queries(brd).select("elements"):
+        package = e.find_package()
+        if package is None:
+            continue
+
+        key = (e.get_library(), e.get_package())
+        if key not in courtyards:
+            courtyards[key] = package_courtyards(package)
+        top, bottom = courtyards[key]
+
+        mirrored = e.get_mirrored()
+        if mirrored:
+            top, bottom = bottom, top
+
+        for side, box in [("top", top), ("bottom", bottom)]:
+            if box is not None:
+                sides[side].append((transform_box(box, e.get_x(), e.get_y(), e.get_rotation(), mirrored), e))
+    return sides
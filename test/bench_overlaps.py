@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+# Time brd-overlaps against the pairwise scan it replaced.
+#
+#   python test/bench_overlaps.py [copies] [boxes]
+#
+# First on test.brd plus 'copies' randomly placed and rotated copies of R1
+# (the whole rule, courtyards included), then on 'boxes' random boxes (just
+# the search for overlapping pairs).  The findings of both ways have to
+# match.
+
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import Swoop
+
+import BoardStyle
+from SwoopChecker import ErrorCollector
+from spatial import boxes_overlap, overlapping_pairs
+
+
+def pairwise(entries):
+    pairs = []
+    for i, (a, pa) in enumerate(entries):
+        for b, pb in entries[i + 1:]:
+            if boxes_overlap(a, b):
+                pairs.append((pa, pb))
+    return pairs
+
+
+def timed(f, *args):
+    start = time.time()
+    r = f(*args)
+    return r, time.time() - start
+
+
+def synthetic_board(copies):
+    brd = Swoop.EagleFile.from_file(os.path.join(os.path.dirname(os.path.abspath(__file__)), "test.brd"))
+    r1 = brd.get_element("R1")
+    for i in range(copies):
+        e = r1.clone()
+        e.set_name("R{}".format(i + 100))
+        e.set_x(round(random.uniform(0, 500), 2))
+        e.set_y(round(random.uniform(0, 500), 2))
+        e.set_rot(random.choice(["R0", "R90", "R180", "R270", "MR0", "MR90", "MR180", "MR270"]))
+        brd.add_element(e)
+    return brd
+
+
+def main():
+    copies = int(sys.argv[1]) if len(sys.argv) > 1 else 2500
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    random.seed(1)
+
+    brd = synthetic_board(copies)
+    found = {}
+    for name, search in [("R-tree", overlapping_pairs), ("pairwise", pairwise)]:
+        BoardStyle.overlapping_pairs = search
+        errors = ErrorCollector()
+        checker = BoardStyle.BoardLint(errors=errors, fix=False, brd=brd, options={"enable": ["brd-overlaps"]})
+        _, seconds = timed(checker.check)
+        found[name] = sorted(str(e) for e in errors.get_errors())
+        print("brd-overlaps, {}, {} elements: {:.2f}s, {} findings".format(name, copies + 5, seconds, len(found[name])))
+    BoardStyle.overlapping_pairs = overlapping_pairs
+    assert found["R-tree"] == found["pairwise"]
+
+    boxes = []
+    for i in range(count):
+        x, y = random.uniform(0, 1000), random.uniform(0, 1000)
+        boxes.append(((x, y, x + random.uniform(1, 10), y + random.uniform(1, 10)), i))
+    tree, tree_seconds = timed(overlapping_pairs, boxes)
+    scan, scan_seconds = timed(pairwise, boxes)
+    print("{} random boxes: R-tree {:.2f}s, pairwise {:.2f}s, {} pairs".format(count, tree_seconds, scan_seconds, len(tree)))
+    assert sorted(tree) == sorted(scan)
+
+
+if __name__ == "__main__":
+    main()
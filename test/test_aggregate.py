@@ -0,0 +1,60 @@
+import unittest
+
+from SwoopChecker import ErrorCollector, Message, Ref, render_message
+
+
+def messages(errors):
+    return [render_message(e.message, html=False) for e in errors.get_errors()]
+
+
+class AggregateTest(unittest.TestCase):
+
+    def test_summary_leaves_out_what_differs(self):
+        errors = ErrorCollector(aggregate=2)
+        for net, x in [("N$1", 1.0), ("5V", 2.0), ("GND", 3.0)]:
+            errors.record_warning(None, Message(u"Net routed at odd angle: {} centered at {} in layer {}", (Ref(net, "net"), x, "Nets")))
+        errors.flush()
+        self.assertEqual(messages(errors),
+                         [u"Net routed at odd angle: ... centered at ... in layer Nets (3 times: N$1, 1.0; 5V, 2.0; ...)"])
+        self.assertEqual(errors.get_errors()[0].count, 3)
+
+    def test_differences_past_the_sample_count(self):
+        # Only one finding is kept, but the others still differ from it.
+        errors = ErrorCollector(aggregate=1)
+        for x in [1.0, 1.0, 2.0]:
+            errors.record_warning(None, Message(u"Junction at {} in layer {}", (x, "Nets")))
+        errors.flush()
+        self.assertEqual(messages(errors), [u"Junction at ... in layer Nets (3 times: 1.0; ...)"])
+
+    def test_same_findings(self):
+        errors = ErrorCollector(aggregate=1)
+        for i in range(3):
+            errors.record_warning(None, Message(u"Junction at {}", (1.0,)))
+        errors.flush()
+        self.assertEqual(messages(errors), [u"Junction at 1.0 (3 times)"])
+
+    def test_places(self):
+        errors = ErrorCollector(aggregate=1)
+        for part in ["R1", "R2"]:
+            with errors.nest(part):
+                errors.record_warning(None, u"Part is odd")
+        errors.flush()
+        self.assertEqual(messages(errors), [u"Part is odd (2 times: at R1; ...)"])
+
+    def test_grouped_by_cause(self):
+        errors = ErrorCollector(aggregate=1)
+        for net, x in [("N$1", 1.0), ("5V", 2.0), ("5V", 3.0)]:
+            errors.record_warning(None, Message(u"{} at {}", (Ref(net, "net"), x)), cause=net)
+        errors.flush()
+        self.assertEqual(messages(errors), [u"N$1 at 1.0", u"5V at ... (2 times: 2.0; ...)"])
+
+    def test_small_groups_are_kept(self):
+        errors = ErrorCollector(aggregate=5)
+        for x in [1.0, 2.0]:
+            errors.record_warning(None, Message(u"Junction at {}", (x,)))
+        errors.flush()
+        self.assertEqual(messages(errors), [u"Junction at 1.0", u"Junction at 2.0"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,50 @@
+import os
+import unittest
+
+import Swoop
+
+from BoardStyle import BoardLint
+from boardscan import BoardScan
+from SwoopChecker import ErrorCollector, render_message
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def findings(brd, rules):
+    errors = ErrorCollector()
+    BoardLint(errors=errors, fix=False, brd=brd, options={"enable": rules}).check()
+    return [(e.level, e.path, render_message(e.message, html=False), e.rule) for e in errors.get_errors()]
+
+
+class BoardScanTest(unittest.TestCase):
+    # The streamable rules find the same things on a scan of a board as on
+    # the board parsed into Swoop objects, and the board's libraries are
+    # examined either way.
+
+    def setUp(self):
+        filename = os.path.join(here, "test.brd")
+        self.tree = Swoop.EagleFile.from_file(filename)
+        with open(filename, "rb") as f:
+            self.scan = BoardScan(f, filename)
+
+    def check_same(self, rules):
+        found = findings(self.tree, rules)
+        self.assertEqual(findings(self.scan, rules), found)
+        return found
+
+    def test_each_streamable_rule(self):
+        for r in BoardLint.get_rules():
+            if r.rule_streamable:
+                self.check_same([r.rule_id])
+
+    def test_all_streamable_rules(self):
+        found = self.check_same([r.rule_id for r in BoardLint.get_rules() if r.rule_streamable])
+        self.assertTrue(any(f[3] == "brd-outline" for f in found))
+
+    def test_libraries_are_examined(self):
+        found = self.check_same(["brd-vias"])
+        self.assertEqual([f[2] for f in found if f[0] == "Info"], [u"Examined test", u"Examined Logos"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,92 @@
+import time
+import unittest
+
+from SwoopChecker import Checker, ErrorCollector, render_message, rule
+from timelimit import can_interrupt
+
+
+def spin(seconds):
+    # Busy, so only the timer can stop it early.
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+
+
+class SlowLint(Checker):
+    # Rules that take as long as they're told to.
+
+    checks = ["check_fast", "check_slow", "check_after"]
+
+    def do_check(self):
+        self.run_checks(self.checks)
+
+    @rule("test-fast")
+    def check_fast(self):
+        self.warn(u"Fast finding")
+
+    @rule("test-slow")
+    def check_slow(self):
+        self.warn(u"Partial finding")
+        spin(5)
+
+    @rule("test-after")
+    def check_after(self):
+        self.warn(u"After finding")
+
+    @rule("test-items")
+    def check_item(self, i, seconds):
+        self.warn(u"Item {}", i)
+        spin(seconds)
+
+
+@unittest.skipUnless(can_interrupt(), "needs interval timers")
+class BudgetTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = ErrorCollector()
+
+    def lint(self, **options):
+        checker = SlowLint(errors=self.errors, fix=False, options=options)
+        with self.errors.nest("slow.brd"):
+            checker.check()
+        return checker
+
+    def messages(self):
+        return [render_message(e.message, html=False) for e in self.errors.get_errors()]
+
+    def test_rule_budget(self):
+        # The slow rule's own finding goes with it; the rules around it run.
+        self.lint(rule_budget=0.05)
+        self.assertEqual(self.messages(), [u"Fast finding",
+                                           u"Rule test-slow skipped after 0.05s on slow.brd",
+                                           u"After finding"])
+
+    def test_rule_items(self):
+        # Findings of the items before the slow one are kept.
+        checker = SlowLint(errors=self.errors, fix=False, options=dict(rule_budget=0.05))
+        with self.errors.nest("slow.brd"):
+            checker.run_rule_items("check_item", [(1, 0), (2, 0), (3, 5), (4, 0)])
+        self.errors.flush()
+        self.assertEqual(self.messages(), [u"Item 1",
+                                           u"Item 2",
+                                           u"Rule test-items skipped after 0.05s on slow.brd"])
+        self.assertEqual([e.rule for e in self.errors.get_errors()], ["test-items"] * 3)
+
+    def test_file_budget(self):
+        # Once the file's time is up the rest of its rules are skipped, and
+        # each one says so once however many times it's asked to run.
+        checker = self.lint(file_budget=0.05)
+        with self.errors.nest("slow.brd"):
+            checker.run_checks(["check_after"])
+        self.assertEqual(self.messages(), [u"Fast finding",
+                                           u"Rule test-slow skipped after 0.05s on slow.brd",
+                                           u"Rule test-after skipped: ran out of time on slow.brd"])
+        self.assertEqual(checker.options["out_of_time"], set(["test-after"]))
+
+    def test_fixes_are_not_interrupted(self):
+        checker = SlowLint(errors=self.errors, fix=True, options=dict(rule_budget=0.05))
+        self.assertEqual(checker.rule_budget(), None)
+
+
+if __name__ == "__main__":
+    unittest.main()
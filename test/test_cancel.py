@@ -0,0 +1,68 @@
+import os
+import unittest
+
+import eaglelint
+from SwoopChecker import ErrorCollector
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def record(errors, level, message):
+    with errors.nest("test.sch"):
+        getattr(errors, "record_" + level)(None, message)
+
+
+class CancelTest(unittest.TestCase):
+
+    def test_fail_fast(self):
+        errors = ErrorCollector(fail_fast=True)
+        record(errors, "warning", u"A warning")
+        record(errors, "info", u"An info")
+        self.assertFalse(errors.cancelled)
+        record(errors, "error", u"An error")
+        self.assertTrue(errors.cancelled)
+        self.assertEqual(errors.cancel_reason, "found an error")
+
+    def test_max_findings(self):
+        # Infos don't count, and findings past the limit are dropped.
+        errors = ErrorCollector(max_findings=2)
+        for level in ["info", "warning", "info", "error", "warning"]:
+            record(errors, level, u"A finding")
+        self.assertEqual([e.level for e in errors.get_errors()], ["Info", "Warning", "Info", "Error"])
+        self.assertTrue(errors.cancelled)
+        self.assertEqual(errors.cancel_reason, "reached 2 findings")
+
+    def test_baseline_findings_dont_count(self):
+        errors = ErrorCollector()
+        record(errors, "error", u"An approved error")
+        approved = errors.get_errors()[0].hash()
+
+        errors = ErrorCollector(fail_fast=True, baseline=[approved])
+        record(errors, "error", u"An approved error")
+        self.assertEqual((errors.get_errors(), errors.cancelled), ([], False))
+        record(errors, "error", u"A new error")
+        self.assertTrue(errors.cancelled)
+
+    def test_rollback_uncancels(self):
+        errors = ErrorCollector(fail_fast=True)
+        mark = errors.mark()
+        record(errors, "error", u"An error")
+        self.assertTrue(errors.cancelled)
+        errors.rollback(mark)
+        self.assertEqual((errors.get_errors(), errors.cancelled, errors.cancel_reason), ([], False, None))
+
+    def test_run_stops(self):
+        files = dict.fromkeys(os.path.join(here, f) for f in ["test.sch", "test.brd", "test.lbr"])
+        everything = ErrorCollector()
+        eaglelint.run_eaglelint_check(files, ["GenericChecks"], errors=everything)
+
+        errors = ErrorCollector(max_findings=3)
+        eaglelint.run_eaglelint_check(files, ["GenericChecks"], errors=errors)
+        findings = [e for e in errors.get_errors() if e.level != "Info"]
+        self.assertEqual(len(findings), 3)
+        self.assertTrue(errors.cancelled)
+        self.assertTrue(len(everything.get_errors()) > len(errors.get_errors()))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,48 @@
+import os
+import unittest
+
+import Swoop
+
+from ConsistencyStyle import ConsistencyLint
+from SwoopChecker import ErrorCollector, render_message
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def lint(sch, brd, rule, part):
+    # What rule says about part.
+    errors = ErrorCollector()
+    ConsistencyLint(errors=errors, fix=False, sch=sch, brd=brd, options={"enable": [rule]}).check()
+    return [m for m in (render_message(e.message, html=False) for e in errors.get_errors()) if " {} ".format(part) in m]
+
+
+def remove_pads(doc, package):
+    for p in Swoop.From(doc).get_libraries().get_packages().with_name(package):
+        p.clear_pads()
+        p.clear_smds()
+
+
+class PartsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.sch = Swoop.EagleFile.from_file(os.path.join(here, "test.sch"))
+        self.brd = Swoop.EagleFile.from_file(os.path.join(here, "test.brd"))
+
+    def test_matching_parts(self):
+        self.assertEqual(lint(self.sch, self.brd, "xref-parts", "R1"), [])
+
+    def test_padless_parts_on_both_sides(self):
+        # A mounting hole or logo in the schematic with a footprint that has
+        # no pads is fine.
+        remove_pads(self.sch, "RESAD1160W55L680D260_HS")
+        remove_pads(self.brd, "RESAD1160W55L680D260_HS")
+        self.assertEqual(lint(self.sch, self.brd, "xref-parts", "R1"), [])
+
+    def test_missing_part(self):
+        self.brd.remove_element(self.brd.get_element("R1"))
+        self.assertEqual(lint(self.sch, self.brd, "xref-parts", "R1"),
+                         [u"Part R1 is in the schematic but not on the board.  Forward/back annotation is broken."])
+
+
+if __name__ == "__main__":
+    unittest.main()
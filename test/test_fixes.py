@@ -0,0 +1,98 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import Swoop
+
+import eaglelint
+from fixes import FixPlan, resolve
+from SwoopChecker import ErrorCollector
+
+here = os.path.dirname(os.path.abspath(__file__))
+designs = ["test.sch", "test.brd", "test.lbr"]
+
+
+class FixPlanTest(unittest.TestCase):
+    # A plan saved with --fix-plan and applied with --apply-plan makes the
+    # same changes as --fix.
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for f in designs:
+            shutil.copy(os.path.join(here, f), self.dir)
+        self.files = [os.path.join(self.dir, f) for f in designs]
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def fix(self, lints, plan, ext=None, dry_run=False):
+        errors = ErrorCollector()
+        eaglelint.run_eaglelint_check(dict.fromkeys(self.files), lints, errors=errors, fix=True, write=ext is not None,
+                                      ext=ext, dry_run=dry_run, options=dict(fixes=plan))
+        return errors
+
+    def save(self):
+        plan = FixPlan()
+        self.fix(["GenericChecks"], plan, dry_run=True)
+        return json.loads(json.dumps(plan.to_json()))
+
+    def written(self, ext):
+        r = {}
+        for f in designs:
+            name = os.path.join(self.dir, f[:-4] + "-" + ext + f[-4:])
+            if os.path.exists(name):
+                with open(name) as g:
+                    r[f] = g.read()
+        return r
+
+    def test_round_trip(self):
+        saved = self.save()
+        self.assertEqual(sorted(set(e["file"] for e in saved["edits"])), sorted([self.files[1], self.files[2]]))
+        self.assertFalse(self.written("plan"))
+
+        errors = self.fix([], FixPlan.from_json(saved), ext="plan")
+        self.assertFalse([e for e in errors.get_errors() if e.level == "Warning"])
+        self.fix(["GenericChecks"], FixPlan(), ext="direct")
+        self.assertEqual(self.written("plan"), self.written("direct"))
+        self.assertEqual(sorted(self.written("plan")), ["test.brd", "test.lbr"])
+
+    def test_applied_twice(self):
+        # Applying a plan to designs it's already been applied to changes
+        # nothing.
+        saved = self.save()
+        plan = FixPlan.from_json(saved)
+        documents = dict((f, Swoop.EagleFile.from_file(f)) for f in self.files)
+        plan.bind(documents)
+        plan.apply()
+        self.assertTrue(plan.is_dirty(documents[self.files[1]]))
+
+        again = FixPlan.from_json(saved)
+        again.bind(documents)
+        again.apply()
+        self.assertEqual((again.applied, again.conflicts), ({}, []))
+
+    def test_conflicts(self):
+        # Edits to values that changed since the plan was made aren't
+        # applied.
+        saved = self.save()
+        edit = next(e for e in saved["edits"] if e["op"] == "set" and e["attr"] == "x")
+        for e in saved["edits"]:
+            if e is not edit:
+                e["file"] = "missing.brd"
+        brd = Swoop.EagleFile.from_file(self.files[1])
+        resolve(brd, edit["path"]).set_x(1.0)
+
+        plan = FixPlan.from_json(saved)
+        plan.bind({self.files[1]: brd})
+        plan.apply()
+        self.assertEqual(plan.applied, {})
+        self.assertEqual(sorted(plan.conflicts),
+                         [(self.files[1], u"set x", "x is 1.0, not {}".format(edit["old"]))] +
+                         [("missing.brd", u"add drawing_element", "not loaded")] * 2 +
+                         [("missing.brd", u"set y", "not loaded")])
+
+
+if __name__ == "__main__":
+    unittest.main()
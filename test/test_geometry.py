@@ -0,0 +1,92 @@
+import math
+import os
+import unittest
+
+import Swoop
+
+from BoardStyle import BoardLint
+from SwoopChecker import ErrorCollector, bounding_box, bounding_boxes, union_of_boxes, transform_point, transform_box, render_message
+from spatial import package_courtyards
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+class Shape(object):
+
+    def __init__(self, *points):
+        self.points = points
+
+    def get_bounds_points(self):
+        return self.points
+
+
+class BoxesTest(unittest.TestCase):
+
+    def test_bounding_box(self):
+        self.assertEqual(bounding_box([Shape((1, 2), (3, 0)), Shape((-1, 5))]), (-1, 0, 3, 5))
+        self.assertEqual(bounding_box(Shape((1, 2))), (1, 2, 1, 2))
+        self.assertRaises(ValueError, bounding_box, [Shape()])
+
+    def test_bounding_boxes(self):
+        x1s, y1s, x2s, y2s = bounding_boxes([Shape((1, 2), (3, 0)), Shape(), Shape((-1, 5))])
+        self.assertEqual(list(x1s)[0::2], [1, -1])
+        self.assertEqual(list(y2s)[0::2], [2, 5])
+        self.assertTrue(all(math.isnan(c[1]) for c in (x1s, y1s, x2s, y2s)))
+
+    def test_union_of_boxes(self):
+        self.assertEqual(union_of_boxes(bounding_boxes([Shape((1, 2), (3, 0)), Shape(), Shape((-1, 5))])), (-1, 0, 3, 5))
+        self.assertEqual(union_of_boxes(bounding_boxes([Shape()])), None)
+        self.assertEqual(union_of_boxes(bounding_boxes([])), None)
+
+    def test_package_courtyards(self):
+        lbr = Swoop.EagleFile.from_file(os.path.join(here, "test.lbr"))
+        packages = dict((p.get_name(), p) for p in lbr.get_library().get_packages())
+
+        # Drawn in tKeepout.
+        self.assertEqual(package_courtyards(packages["PJ-102A"]), ((-15.24, -10.16, 1.27, 1.27), None))
+
+        # Nothing in tKeepout, so the extent of the pads.
+        top, bottom = package_courtyards(packages["RESAD1160W55L680D260_HS"])
+        self.assertEqual(bottom, None)
+        self.assertEqual(tuple(round(v, 2) for v in top), (-6.4, -0.6, 6.4, 0.6))
+
+
+class PlacementTest(unittest.TestCase):
+    # Eagle rotates a part counter-clockwise and then mirrors it about the y
+    # axis, so mirrored parts turn clockwise as seen from the top.
+
+    def place(self, point, rotation, mirrored):
+        return tuple(round(v, 6) for v in transform_point(point[0], point[1], 10, 20, rotation, mirrored))
+
+    def test_rotation(self):
+        self.assertEqual(self.place((1, 0), 90, False), (10, 21))
+        self.assertEqual(self.place((1, 0), 180, False), (9, 20))
+        self.assertEqual(self.place((1, 2), 270, False), (12, 19))
+        self.assertEqual(self.place((1, 0), 45, False), (round(10 + math.sqrt(0.5), 6), round(20 + math.sqrt(0.5), 6)))
+
+    def test_mirrored_rotation(self):
+        self.assertEqual(self.place((1, 0), 0, True), (9, 20))
+        self.assertEqual(self.place((1, 0), 90, True), (10, 21))
+        self.assertEqual(self.place((0, 1), 90, True), (11, 20))
+        self.assertEqual(self.place((1, 0), 270, True), (10, 19))
+        self.assertEqual(self.place((0, 1), 270, True), (9, 20))
+
+    def test_mirrored_box(self):
+        self.assertEqual(transform_box((-15.24, -10.16, 1.27, 1.27), 48, 24, 90, True), (37.84, 8.76, 49.27, 25.27))
+
+
+class OverlapsTest(unittest.TestCase):
+    # On overlaps.brd every part is mirrored onto the bottom.  J2 (MR90)
+    # overlaps R1, and J3 (MR270) clears S2; mirroring before rotating would
+    # have it the other way around.
+
+    def test_mirrored_rotated_courtyards(self):
+        errors = ErrorCollector()
+        brd = Swoop.EagleFile.from_file(os.path.join(here, "overlaps.brd"))
+        BoardLint(errors=errors, fix=False, brd=brd, options={"enable": ["brd-overlaps"]}).check()
+        self.assertEqual([render_message(e.message, html=False) for e in errors.get_errors() if e.rule == "brd-overlaps"],
+                         [u"Parts R1 and J2 overlap on the bottom of the board.  Move them apart so their keepout areas don't intersect."])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import os
+import subprocess
+import sys
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+top = os.path.dirname(here)
+
+# Lints the files in a fresh interpreter and prints which of the board
+# modules it imported.
+script = """
+import sys
+import eaglelint
+eaglelint.run_eaglelint_check(dict.fromkeys(sys.argv[2:]), ["GenericChecks"], options={"enable": sys.argv[1].split(",")})
+print(" ".join(m for m in ["BoardStyle", "spatial", "boardscan"] if m in sys.modules))
+"""
+
+
+def imported(rules, *files):
+    env = dict(os.environ, PYTHONPATH=top)
+    out = subprocess.check_output([sys.executable, "-c", script, rules] + [os.path.join(here, f) for f in files], env=env, cwd=here)
+    return out.split()
+
+
+class LoadingTest(unittest.TestCase):
+
+    def test_library_runs_leave_boards_alone(self):
+        self.assertEqual(imported("*", "test.lbr"), [])
+
+    def test_streamable_rules_scan_boards(self):
+        self.assertEqual(imported("brd-vias", "test.brd"), ["BoardStyle", "spatial", "boardscan"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,35 @@
+import unittest
+
+from SwoopChecker import Checker, ErrorCollector, Message, render_message
+
+
+class MessagesTest(unittest.TestCase):
+
+    def setUp(self):
+        self.errors = ErrorCollector()
+        self.checker = Checker(errors=self.errors, fix=False)
+
+    def test_template(self):
+        self.checker.error(u"Part {} is {}", "R1", "odd", inexcusable=True)
+        e = self.errors.get_errors()[0]
+        self.assertTrue(isinstance(e.message, Message))
+        self.assertEqual(render_message(e.message, html=False), u"Part R1 is odd")
+        self.assertTrue(e.inexcusable)
+
+    def test_positional_inexcusable(self):
+        # Older checkers pass inexcusable after a finished message.
+        self.checker.error(u"Part R1 is odd", True)
+        self.checker.warn(u"Part R2 is odd", False)
+        e, w = self.errors.get_errors()
+        self.assertEqual((e.message, e.inexcusable), (u"Part R1 is odd", True))
+        self.assertEqual((w.message, w.inexcusable), (u"Part R2 is odd", False))
+
+    def test_arguments_without_placeholders(self):
+        self.assertRaises(TypeError, self.checker.error, u"Part R1 is odd", "R1")
+        self.assertRaises(TypeError, self.checker.warn, u"Part R1 is odd", True, True)
+        self.assertRaises(TypeError, self.checker.info, u"Part R1 is odd", True)
+        self.assertEqual(self.errors.get_errors(), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
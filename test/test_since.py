@@ -0,0 +1,80 @@
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+here = os.path.dirname(os.path.abspath(__file__))
+top = os.path.dirname(here)
+designs = ["test.sch", "test.brd", "test.lbr"]
+
+
+class SinceTest(unittest.TestCase):
+    # Running only the rules that cover what changed, and carrying over the
+    # rest from the previous run, finds what a full run does.
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        for f in designs:
+            shutil.copy(os.path.join(here, f), self.dir)
+        self.git("init", "-q")
+        self.git("add", *designs)
+        self.git("-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "-q", "-m", "Designs")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def git(self, *args):
+        with open(os.devnull, "w") as devnull:
+            subprocess.check_call(["git"] + list(args), cwd=self.dir, stdout=devnull)
+
+    def lint(self, output, *args):
+        # The findings, and what eaglelint said on stderr.
+        p = subprocess.Popen([sys.executable, os.path.join(top, "eaglelint.py"), "--files"] + designs +
+                             ["--format", "jsonl", "--output", output] + list(args),
+                             cwd=self.dir, stderr=subprocess.PIPE)
+        _, err = p.communicate()
+        # Exits with 1 because the designs have errors.
+        self.assertEqual(p.returncode, 1, err)
+        with open(os.path.join(self.dir, output)) as f:
+            found = [json.loads(l) for l in f]
+        return sorted((d["level"], d["path"], d["error"], d["rule"], d["hash"]) for d in found), err
+
+    def edit(self, filename, old, new):
+        path = os.path.join(self.dir, filename)
+        with open(path) as f:
+            data = f.read()
+        self.assertTrue(old in data)
+        with open(path, "w") as f:
+            f.write(data.replace(old, new))
+
+    def test_moved_element(self):
+        previous, _ = self.lint("previous.jsonl")
+        self.edit("test.brd", '<element name="R1" library="test" package="RESAD1160W55L680D260_HS" value="330Ohms" x="39" y="10"',
+                  '<element name="R1" library="test" package="RESAD1160W55L680D260_HS" value="330Ohms" x="39.3" y="10"')
+
+        full, _ = self.lint("full.jsonl")
+        self.assertNotEqual(full, previous)
+        since, err = self.lint("since.jsonl", "--since", "HEAD", "--previous", "previous.jsonl")
+        self.assertEqual(since, full)
+        self.assertTrue("changed since HEAD: 1 elements" in err, err)
+        self.assertFalse("skipping 0 rules" in err, err)
+
+    def test_nothing_changed(self):
+        previous, _ = self.lint("previous.jsonl")
+        since, err = self.lint("since.jsonl", "--since", "HEAD", "--previous", "previous.jsonl")
+        self.assertEqual(since, previous)
+        self.assertTrue("changed since HEAD: nothing" in err, err)
+
+    def test_disabled_rules(self):
+        # Rules turned off don't come back through --since.
+        previous, _ = self.lint("previous.jsonl", "--disable", "lbr-*")
+        since, err = self.lint("since.jsonl", "--disable", "lbr-*", "--since", "HEAD", "--previous", "previous.jsonl")
+        self.assertEqual(since, previous)
+        self.assertFalse(any(f[2] == u"Examined test.lbr" for f in since))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+import json
+import unittest
+from StringIO import StringIO
+
+import sinks
+from SwoopChecker import Error, ErrorCollector, Message
+
+
+def run(format, quiet=False, aggregate=None):
+    # The output of a run with a few findings.
+    stream = StringIO()
+    errors = ErrorCollector(sinks=[sinks.make_sink(format, stream, quiet=quiet)], aggregate=aggregate)
+    with errors.nest("test.sch"):
+        errors.rule = "sch-test"
+        errors.record_error("R1", u"Part R1 is odd")
+        for x in [1.0, 2.0, 3.0]:
+            errors.record_warning(None, Message(u"Junction at {}", (x,)))
+        errors.rule = None
+        errors.record_info(None, u"Examined test")
+    errors.close()
+    return stream.getvalue(), errors
+
+
+class SinksTest(unittest.TestCase):
+
+    def test_text(self):
+        out, errors = run("text")
+        self.assertEqual(out.splitlines(), [u"{}".format(e) for e in errors.get_errors()])
+        self.assertTrue(out.startswith(u"Error: test.sch:R1 -- Part R1 is odd (sch-test, :"))
+
+    def test_quiet(self):
+        for format in sinks.formats:
+            out, errors = run(format, quiet=True)
+            self.assertFalse("Examined test" in out, format)
+
+    def test_jsonl(self):
+        # Each line loads back into the finding it came from.
+        out, errors = run("jsonl")
+        lines = [json.loads(l) for l in out.splitlines()]
+        self.assertEqual(len(lines), 5)
+        for d, e in zip(lines, errors.get_errors()):
+            self.assertEqual(d.pop("hash"), e.hash())
+            self.assertEqual(Error(**d).hash(), e.hash())
+        self.assertEqual([(d["level"], d["rule"]) for d in lines],
+                         [("Error", "sch-test")] + [("Warning", "sch-test")] * 3 + [("Info", None)])
+
+    def test_sarif(self):
+        out, errors = run("sarif", aggregate=2)
+        log = json.loads(out)
+        self.assertEqual(log["version"], "2.1.0")
+        # Infos aren't aggregated, so they come out first.
+        results = log["runs"][0]["results"]
+        self.assertEqual([r["level"] for r in results], ["note", "error", "warning"])
+        results = results[1:] + results[:1]
+        self.assertEqual(results[0]["ruleId"], "sch-test")
+        self.assertEqual(results[0]["locations"][0]["physicalLocation"]["artifactLocation"]["uri"], "test.sch")
+        self.assertEqual(results[0]["locations"][0]["logicalLocations"][0]["fullyQualifiedName"], "test.sch:R1")
+        self.assertEqual(results[0]["partialFingerprints"]["eaglelint/v1"], errors.get_errors()[1].hash())
+        self.assertEqual(results[1]["occurrenceCount"], 3)
+        self.assertFalse("ruleId" in results[2])
+
+    def test_empty_sarif(self):
+        stream = StringIO()
+        ErrorCollector(sinks=[sinks.make_sink("sarif", stream)]).close()
+        self.assertEqual(json.loads(stream.getvalue())["runs"][0]["results"], [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import batch
+import workqueue
+from SwoopChecker import ErrorCollector
+
+here = os.path.dirname(os.path.abspath(__file__))
+
+
+def items(*ids):
+    return [dict(id=id, name=id, files=[]) for id in ids]
+
+
+class DirectoryQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.path = os.path.join(self.dir, "queue")
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def queue(self, lease=600):
+        return workqueue.open_queue(self.path, lease=lease)
+
+    def test_claims(self):
+        q = self.queue()
+        q.publish({}, items("000000", "000001"))
+        self.assertEqual(q.claim("a")["id"], "000000")
+        self.assertEqual(q.claim("b")["id"], "000001")
+        self.assertEqual(q.claim("c"), None)
+        q.expire()
+        self.assertEqual(q.claim("c"), None)
+        self.assertFalse(q.finished())
+
+    def test_publish_once(self):
+        self.queue().publish({}, items("000000"))
+        self.assertRaises(ValueError, self.queue().publish, {}, items("000000"))
+
+    def test_expired_lease(self):
+        # A dead worker's project goes to the next one, and if the first
+        # worker finishes after all, its result is the one kept.
+        q = self.queue(lease=-1)
+        q.publish({}, items("000000"))
+        slow = q.claim("slow")
+        q.expire()
+        again = q.claim("fast")
+        self.assertEqual(again["id"], "000000")
+        self.assertNotEqual(again["claim"], slow["claim"])
+
+        q.complete(slow, dict(worker="slow", findings=[]))
+        q.complete(again, dict(worker="fast", findings=[]))
+        self.assertTrue(q.finished())
+        self.assertEqual([(i["id"], r["worker"]) for i, r in q.results()], [("000000", "slow")])
+        self.assertEqual(os.listdir(os.path.join(self.path, "claimed")), [])
+
+    def test_expired_after_result(self):
+        # A finished project whose claim outlived its lease isn't handed
+        # out again.
+        q = self.queue(lease=-1)
+        q.publish({}, items("000000"))
+        item = q.claim("a")
+        workqueue.write_once(os.path.join(self.path, "results", "000000"), dict(worker="a", findings=[]))
+        q.expire()
+        self.assertEqual(q.claim("b"), None)
+        self.assertEqual(os.listdir(os.path.join(self.path, "claimed")), [])
+
+    def test_unfinished_projects(self):
+        q = self.queue()
+        q.publish({}, items("000000"))
+        errors = workqueue.merge(q, ErrorCollector())
+        self.assertEqual([u"{}".format(e.error) for e in errors.get_errors()],
+                         [u"Not checked: no worker has finished this project"])
+
+
+class WorkTest(unittest.TestCase):
+    # Linting through a queue finds what linting the tree directly does.
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        self.tree = os.path.join(self.dir, "tree")
+        os.makedirs(os.path.join(self.tree, "board"))
+        for f in ["test.sch", "test.brd", "test.lbr"]:
+            shutil.copy(os.path.join(here, f), os.path.join(self.tree, "board"))
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def test_same_findings(self):
+        q = workqueue.open_queue(os.path.join(self.dir, "queue"))
+        published = workqueue.publish(q, self.tree, ["GenericChecks"], options={})
+        self.assertEqual(workqueue.work(q, poll=0), len(published))
+        queued = workqueue.merge(q, ErrorCollector())
+
+        direct = batch.check_tree(self.tree, ["GenericChecks"], ErrorCollector(), filter=True)
+        self.assertTrue(direct.get_errors())
+        self.assertEqual([e.get_full_string() for e in queued.get_errors()],
+                         [e.get_full_string() for e in direct.get_errors()])
+
+
+if __name__ == "__main__":
+    unittest.main()
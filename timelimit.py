@@ -0,0 +1,46 @@
+import contextlib
+import signal
+import threading
+import time
+
+# Interrupt code that runs too long.  The limit is enforced with a SIGALRM
+# timer, so it works on pure Python code without the code having to
+# cooperate.  Where timers aren't available (Windows, or off the main
+# thread) limits are not enforced.
+
+
+class Timeout(BaseException):
+    # Not an Exception so that a rule's own 'except Exception' doesn't
+    # swallow it.
+    pass
+
+
+def can_interrupt():
+    return hasattr(signal, "setitimer") and isinstance(threading.current_thread(), threading._MainThread)
+
+
+def _expire(signum, frame):
+    raise Timeout()
+
+
+@contextlib.contextmanager
+def time_limit(seconds):
+    # Raise Timeout in the body if it runs for more than seconds.  Limits
+    # nest: an inner limit never outlives the one around it.
+    if seconds is None or not can_interrupt():
+        yield
+        return
+
+    start = time.time()
+    previous_handler = signal.signal(signal.SIGALRM, _expire)
+    outer, _ = signal.setitimer(signal.ITIMER_REAL, 0)
+    if outer and outer < seconds:
+        seconds = outer
+    signal.setitimer(signal.ITIMER_REAL, max(seconds, 1e-6))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous_handler)
+        if outer:
+            signal.setitimer(signal.ITIMER_REAL, max(outer - (time.time() - start), 1e-6))
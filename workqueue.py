@@ -0,0 +1,240 @@
+import json
+import os
+import socket
+import time
+
+import batch
+
+# Linting a tree of designs across several machines.  A coordinator
+# publishes the projects to a queue, workers on any number of hosts claim
+# them one at a time, lint them and write a result shard (the findings,
+# dumped) for each, and a merge step turns the shards into one report.
+#
+# A claim is a lease: if a worker dies, its projects go back in the queue
+# once their leases expire and another worker picks them up.  If the first
+# worker was only slow and finishes anyway, the first result written wins.
+#
+# Queues are pluggable; 'backends' maps the scheme of a queue spec
+# ('dir:/shared/lint-queue') to the class that implements it.  The default
+# is a shared directory, which works on one box or over a network file
+# system, as long as design paths are the same on every host.
+
+
+class WorkQueue(object):
+    # Items are JSON-able dicts with an "id", published in the order they
+    # should be claimed.
+
+    def publish(self, config, items):
+        raise NotImplementedError()
+
+    def config(self):
+        raise NotImplementedError()
+
+    def claim(self, worker):
+        # The next item, or None if none are waiting.
+        raise NotImplementedError()
+
+    def complete(self, item, result):
+        raise NotImplementedError()
+
+    def expire(self):
+        # Put items whose leases have run out back in the queue.
+        pass
+
+    def finished(self):
+        # Whether every item has a result.
+        raise NotImplementedError()
+
+    def results(self):
+        # [(item, result or None), ...] in the order the items were published.
+        raise NotImplementedError()
+
+
+def write_temporary(path, data):
+    tmp = "{}.tmp-{}-{}".format(path, socket.gethostname(), os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(data, f, sort_keys=True)
+    return tmp
+
+
+def write_atomically(path, data):
+    os.rename(write_temporary(path, data), path)
+
+
+def write_once(path, data):
+    # Write path unless it already exists.  Linking fails if it does, so of
+    # two writers racing, exactly one wins.  Returns whether we did.
+    tmp = write_temporary(path, data)
+    try:
+        os.link(tmp, path)
+        return True
+    except OSError:
+        return False
+    finally:
+        os.remove(tmp)
+
+
+def read_json(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def native(s):
+    # JSON gives us unicode, but paths (and error paths) are str.
+    return s.encode("utf-8")
+
+
+class DirectoryQueue(WorkQueue):
+    # config.json          the run's settings
+    # items/ID             every item, as published
+    # pending/ID           items waiting for a worker
+    # claimed/ID@DEADLINE@WORKER
+    #                      items being worked on, and until when
+    # results/ID           result shards
+    #
+    # Items move between pending/ and claimed/ by rename, which is atomic,
+    # so two workers can never claim the same item.
+
+    def __init__(self, path, lease=600):
+        self.path = path
+        self.lease = lease
+
+    def dir(self, *names):
+        return os.path.join(self.path, *names)
+
+    def publish(self, config, items):
+        # Item IDs start over with every run, so a used queue's results
+        # would answer for the new items.
+        if os.path.exists(self.dir("config.json")):
+            raise ValueError("{} already holds a run; publish to an empty directory".format(self.path))
+        for d in ["items", "pending", "claimed", "results"]:
+            if not os.path.isdir(self.dir(d)):
+                os.makedirs(self.dir(d))
+        write_atomically(self.dir("config.json"), config)
+        for item in items:
+            write_atomically(self.dir("items", item["id"]), item)
+        for item in items:
+            open(self.dir("pending", item["id"]), "w").close()
+
+    def config(self):
+        return read_json(self.dir("config.json"))
+
+    def claim(self, worker):
+        worker = worker.replace("@", "_").replace(os.sep, "_")
+        for id in sorted(os.listdir(self.dir("pending"))):
+            claim = "{}@{:.0f}@{}".format(id, time.time() + self.lease, worker)
+            try:
+                os.rename(self.dir("pending", id), self.dir("claimed", claim))
+            except OSError:
+                continue  # Someone else got it first.
+            item = read_json(self.dir("items", id))
+            item["claim"] = claim
+            return item
+        return None
+
+    def complete(self, item, result):
+        write_once(self.dir("results", item["id"]), result)
+        try:
+            os.remove(self.dir("claimed", item["claim"]))
+        except OSError:
+            pass  # Our lease expired and it was put back or claimed again.
+
+    def expire(self):
+        now = time.time()
+        for claim in os.listdir(self.dir("claimed")):
+            id, deadline, worker = claim.split("@", 2)
+            if float(deadline) >= now:
+                continue
+            try:
+                if os.path.exists(self.dir("results", id)):
+                    os.remove(self.dir("claimed", claim))
+                else:
+                    os.rename(self.dir("claimed", claim), self.dir("pending", id))
+            except OSError:
+                pass  # Someone else expired it first.
+
+    def finished(self):
+        return set(os.listdir(self.dir("items"))) <= set(os.listdir(self.dir("results")))
+
+    def results(self):
+        done = set(os.listdir(self.dir("results")))
+        for id in sorted(os.listdir(self.dir("items"))):
+            item = read_json(self.dir("items", id))
+            yield item, read_json(self.dir("results", id)) if id in done else None
+
+
+backends = {"dir": DirectoryQueue}
+
+
+def open_queue(spec, lease=600):
+    # 'scheme:location', or just a directory.
+    scheme, _, location = spec.partition(":")
+    if scheme not in backends or not location:
+        scheme, location = "dir", spec
+    return backends[scheme](location, lease=lease)
+
+
+def publish(queue, root, lints, options, filter=True, aggregate=None, html=False):
+    projects, libraries = batch.find_projects(root)
+    config = dict(lints=lints,
+                  options=options,
+                  filter=filter,
+                  aggregate=aggregate,
+                  html=html,
+                  libraries=[os.path.abspath(l) for l in libraries])
+    items = [dict(id="{:06d}".format(i), name=p.name, files=[os.path.abspath(f) for f in p.files])
+             for i, p in enumerate(batch.schedule(projects))]
+    queue.publish(config, items)
+    return items
+
+
+def work(queue, poll=5, progress=None):
+    # Claim and lint projects until every one has a result.
+    import SwoopChecker
+
+    config = queue.config()
+    # Findings are rendered by the workers.
+    SwoopChecker.html_output = config["html"]
+    options = batch.load_libraries([native(l) for l in config["libraries"]], config["options"])
+    worker = "{}:{}".format(socket.gethostname(), os.getpid())
+    checked = 0
+
+    while True:
+        queue.expire()
+        item = queue.claim(worker)
+        if item is None:
+            if queue.finished():
+                return checked
+            # Wait for other workers to finish, or for their leases to run out.
+            time.sleep(poll)
+            continue
+
+        name = native(item["name"])
+        errors = SwoopChecker.ErrorCollector(aggregate=config["aggregate"])
+        try:
+            project = batch.Project(name, [native(f) for f in item["files"]])
+            dumped, seconds, built = batch.lint_project(project, config["lints"], errors, options, filter=config["filter"])
+        except Exception as e:
+            # Record it, so the project isn't handed to worker after worker.
+            with errors.nest(name):
+                errors.record_error(None, u"Couldn't check: {}".format(e))
+            dumped, seconds = errors.dump_json(), 0.0
+        queue.complete(item, dict(worker=worker, seconds=seconds, findings=dumped))
+        checked += 1
+        if progress:
+            progress.write("eaglelint: {} checked {} in {:.1f}s\n".format(worker, name, seconds))
+
+
+def merge(queue, errors):
+    # Pass every shard's findings to errors, in the order the projects were
+    # published.  Projects nobody has finished are reported as errors.
+    for item, result in queue.results():
+        if errors.cancelled:
+            break
+        if result is None:
+            with errors.nest(native(item["name"])):
+                errors.record_error(None, u"Not checked: no worker has finished this project")
+        else:
+            errors.merge(result["findings"])
+        errors.flush()
+    return errors